@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+from kafe_engine import KafeEngine, buat_kafe_search, buat_kafe_token_matrix, buat_token_index, kata_kritik_umum
+from review_cache import TOKEN_COLS, encode_review_tokens
+from vocabulary import LIBRARY_PATH, load_vocabulary
+
+
+REPORT_PATH = "data/cache/benchmark.json"
+
+
+def buat_review_sintetis(n_review, daftar_kafe, vocab, rng, panjang_rata=40, porsi_english=0.3):
+    # Skema sama dengan hasil_skor_dan_aspek.xlsx (setelah parse): Nama Kafe + 2 kolom list token.
+    # Token diambil sesuai frekuensi di tokens_library.txt, panjang review ~ Poisson
+    panjang = np.maximum(rng.poisson(panjang_rata, size=n_review), 1)
+    peluang = vocab.freq[:vocab.n_library] / vocab.freq[:vocab.n_library].sum()
+    token = np.array(vocab.id_to_token[:vocab.n_library], dtype=object)[
+        rng.choice(vocab.n_library, size=int(panjang.sum()), p=peluang)
+    ]
+
+    offsets = np.r_[0, np.cumsum(panjang)]
+    n_indo = np.round(panjang * (1 - porsi_english)).astype(np.int64)
+    indo, english = [], []
+    for a, b, n in zip(offsets[:-1], offsets[1:], n_indo):
+        indo.append(token[a:a + n].tolist())
+        english.append(token[a + n:b].tolist())
+
+    return pd.DataFrame({
+        "Nama Kafe": np.asarray(daftar_kafe, dtype=object)[rng.integers(len(daftar_kafe), size=n_review)],
+        TOKEN_COLS[0]: indo,
+        TOKEN_COLS[1]: english
+    })
+
+
+def buat_case_vector_sintetis(daftar_kafe, rng, dim=100):
+    # Skema sama dengan case_vector_df.pkl: Nama Kafe, dim_0..dim_{dim-1}, avg_sentiment
+    df = pd.DataFrame(rng.standard_normal((len(daftar_kafe), dim)).astype(np.float32),
+                      columns=[f"dim_{i}" for i in range(dim)])
+    df.insert(0, "Nama Kafe", list(daftar_kafe))
+    df["avg_sentiment"] = rng.uniform(1, 5, size=len(daftar_kafe))
+    return df
+
+
+def buat_word_vectors_sintetis(kategori_suasana, rng, dim=100):
+    # Vektor acak untuk semua keyword kategori_suasana, pengganti model Word2Vec
+    semua_keyword = sorted({k for sub_dict in kategori_suasana.values() for kws in sub_dict.values() for k in kws})
+    return {k: rng.standard_normal(dim).astype(np.float32) for k in semua_keyword}
+
+
+def buat_preferensi_sintetis(kategori_suasana, rng):
+    # Seperti checklist di app: paling banyak satu sub-label per kategori
+    kategori = list(kategori_suasana.items())
+    preferensi_label, preferensi_dict = {}, {}
+    for i in rng.choice(len(kategori), size=rng.integers(1, 6), replace=False):
+        nama_kategori, sub_dict = kategori[i]
+        sub_label = list(sub_dict)[rng.integers(len(sub_dict))]
+        preferensi_label[nama_kategori] = sub_label
+        preferensi_dict[sub_label] = sub_dict[sub_label]
+    return preferensi_label, preferensi_dict
+
+
+def _ukur_build(build, nama, fn, *args):
+    t0 = time.perf_counter()
+    keluaran = fn(*args)
+    build[nama] = time.perf_counter() - t0
+    return keluaran
+
+
+def _ukur(fn, args_list, pemanasan=1):
+    for args in args_list[:pemanasan]:
+        fn(*args)
+    waktu = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        waktu.append(time.perf_counter() - t0)
+    waktu = 1000 * np.array(waktu)
+    return {"median_ms": float(np.median(waktu)), "p95_ms": float(np.percentile(waktu, 95)), "n": len(waktu)}
+
+
+def jalankan_skala(n_kafe, review_per_kafe, vocab, kategori_suasana, n_query, rng):
+    daftar_kafe = [f"Kafe {i}" for i in range(n_kafe)]
+    hasil = {"n_kafe": n_kafe, "n_review": n_kafe * review_per_kafe, "build_s": {}}
+
+    t0 = time.perf_counter()
+    df_review = buat_review_sintetis(n_kafe * review_per_kafe, daftar_kafe, vocab, rng)
+    df_kafe = buat_case_vector_sintetis(daftar_kafe, rng)
+    word_vectors = buat_word_vectors_sintetis(kategori_suasana, rng)
+    hasil["generate_s"] = time.perf_counter() - t0
+
+    # Tahap yang sama dengan loader app (review_cache -> kafe_engine), diukur per tahap
+    build = hasil["build_s"]
+    review_tokens = _ukur_build(build, "encode_tokens", encode_review_tokens, df_review, vocab)
+    kafe_token_matrix = _ukur_build(build, "kafe_token_matrix", buat_kafe_token_matrix, df_review, review_tokens, vocab)
+    token_index = _ukur_build(build, "token_index", buat_token_index, kafe_token_matrix)
+    kafe_search = _ukur_build(build, "kafe_search", buat_kafe_search, df_kafe, "exact")
+    hasil["n_token"] = int(len(review_tokens.ids))
+
+    engine = KafeEngine(kafe_token_matrix, token_index, df_kafe, kafe_search, word_vectors)
+
+    queries = []
+    for _ in range(n_query):
+        preferensi_label, preferensi_dict = buat_preferensi_sintetis(kategori_suasana, rng)
+        keywords = [k for kws in preferensi_dict.values() for k in kws]
+        avoid = list(rng.choice(kata_kritik_umum, size=rng.integers(1, 5), replace=False))
+        popularitas = rng.uniform(0, 1, size=n_kafe).astype(np.float32)
+        queries.append((preferensi_dict, keywords, avoid, popularitas))
+
+    # Vektor query di-cache per engine: cache dikosongkan supaya crs_rank terukur dengan
+    # menghitung vektor query (seperti query pertama user); refine & penjelasan memakai cache-nya
+    top = [engine.crs_rank(keywords, 5, popularitas) for _, keywords, _, popularitas in queries]
+    engine.vektor_kata._query_vector.cache_clear()
+
+    hasil["query_based"] = _ukur(engine.query_based, [(q[0],) for q in queries])
+    hasil["crs_rank"] = _ukur(lambda kw, pop: engine.crs_rank(kw, 5, pop), [(q[1], q[3]) for q in queries], pemanasan=0)
+    hasil["refine"] = _ukur(
+        lambda kw, avoid, prev, pop: engine.refine(kw, avoid, prev, 5, pop),
+        [(q[1], q[2], [r["Nama Kafe"] for r in t], q[3]) for q, t in zip(queries, top)]
+    )
+    hasil["penjelasan"] = _ukur(engine.penjelasan, [(t, q[1], q[0]) for q, t in zip(queries, top)])
+    hasil["hybrid"] = _ukur(lambda pref, pop: engine.hybrid(pref, 5, pop), [(q[0], q[3]) for q in queries])
+    return hasil
+
+
+def _commit_sekarang():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bandingkan_laporan(lama, baru):
+    # Rasio waktu baru / lama per skala & operasi (> 1 berarti lebih lambat)
+    lama_per_skala = {(h["n_kafe"], h["n_review"]): h for h in lama["hasil"]}
+    baris = []
+    for h in baru["hasil"]:
+        h_lama = lama_per_skala.get((h["n_kafe"], h["n_review"]))
+        if h_lama is None:
+            continue
+        for op in ["query_based", "crs_rank", "refine", "penjelasan", "hybrid"]:
+            if op in h_lama:
+                baris.append((h["n_kafe"], op, h_lama[op]["median_ms"], h[op]["median_ms"],
+                              h[op]["median_ms"] / max(h_lama[op]["median_ms"], 1e-9)))
+    return baris
+
+
+if __name__ == "__main__":
+    from kategori_suasana_dict_updated import kategori_suasana
+
+    parser = argparse.ArgumentParser(description="Benchmark alur rekomendasi dengan review & case vector sintetis.")
+    parser.add_argument("--n-kafe", type=int, nargs="+", default=[200, 1000, 5000])
+    parser.add_argument("--review-per-kafe", type=int, default=50)
+    parser.add_argument("--n-query", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--library", default=LIBRARY_PATH)
+    parser.add_argument("--output", default=REPORT_PATH)
+    parser.add_argument("--bandingkan", help="laporan JSON lama (mis. dari commit sebelumnya)")
+    args = parser.parse_args()
+
+    vocab = load_vocabulary(args.library)
+    rng = np.random.default_rng(args.seed)
+
+    laporan = {
+        "commit": _commit_sekarang(),
+        "waktu": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "args": vars(args),
+        "hasil": []
+    }
+    for n_kafe in args.n_kafe:
+        hasil = jalankan_skala(n_kafe, args.review_per_kafe, vocab, kategori_suasana, args.n_query, rng)
+        laporan["hasil"].append(hasil)
+        print(f"{hasil['n_kafe']:>6} kafe, {hasil['n_review']:>8} review ({hasil['n_token']} token) | "
+              f"build {sum(hasil['build_s'].values()):.2f} s | "
+              + " | ".join(f"{op} {hasil[op]['median_ms']:.2f} ms" for op in ["query_based", "crs_rank", "refine", "penjelasan", "hybrid"]))
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(laporan, f, indent=2)
+    print(f"Laporan: {args.output}")
+
+    if args.bandingkan:
+        with open(args.bandingkan, "r", encoding="utf-8") as f:
+            lama = json.load(f)
+        print(f"Dibanding {lama.get('commit')} (median, baru/lama):")
+        for n_kafe, op, ms_lama, ms_baru, rasio in bandingkan_laporan(lama, laporan):
+            print(f"{n_kafe:>6} kafe {op:<12}: {ms_lama:8.2f} -> {ms_baru:8.2f} ms  x{rasio:.2f}")
@@ -0,0 +1,218 @@
+import argparse
+import time
+
+import numpy as np
+
+from casebase_repo import IncrementalCaseIndex, fingerprint_case
+from similarity_search import _top_k, normalisasi
+
+
+class CaseRetrieval(IncrementalCaseIndex):
+    # k-nearest past cases. Embedding case = rata-rata vektor crs_keywords (ternormalisasi)
+    # digabung one-hot sub-label preferensi_label. Case dengan fingerprint yang sama punya
+    # embedding yang sama, jadi yang diindeks hanya fingerprint unik.
+    # Sampai batas_eksak fingerprint dicari eksak, di atasnya lewat random-projection LSH
+    # (seperti LSHSearch) yang bisa ditambah bertahap, lalu kandidat di-rerank eksak
+    def __init__(self, query_vector_fn, sub_labels, bobot_label=0.5, batas_eksak=20000,
+                 n_bits=16, n_tabel=8, seed=42):
+        self.query_vector_fn = query_vector_fn
+        self.label_id = {sub_label: i for i, sub_label in enumerate(sub_labels)}
+        self.bobot_label = bobot_label
+        self.batas_eksak = batas_eksak
+        self.n_bits = n_bits
+        self.n_tabel = n_tabel
+        self.seed = seed
+        super().__init__()
+
+    def _reset(self):
+        super()._reset()
+        self.fingerprint_id = {}
+        self.kelompok = []  # case per fingerprint, urutan sesuai casebase
+        self.n_case = 0
+        self._matrix = None
+        self._kode = None  # kode bucket LSH per tabel x fingerprint
+        self._planes = None
+        self._terurut = None  # (kode terurut, baris) semua tabel untuk n_terurut baris pertama
+        self.n_terurut = 0
+
+    def __len__(self):
+        return self.n_case
+
+    def embed(self, keywords, preferensi_label):
+        kata_vec = normalisasi(self.query_vector_fn(keywords))[0]
+        label_vec = np.zeros(len(self.label_id), dtype=np.float32)
+        for sub_label in preferensi_label.values():
+            if sub_label in self.label_id:
+                label_vec[self.label_id[sub_label]] = 1.0
+        label_vec = normalisasi(label_vec)[0] * self.bobot_label
+        return normalisasi(np.concatenate([kata_vec, label_vec]))[0]
+
+    def _kode_lsh(self, vectors):
+        # Semua tabel diproyeksikan dalam satu perkalian matriks -> (n_tabel, n_vektor)
+        bit = (vectors @ self._planes > 0).reshape(len(vectors), self.n_tabel, self.n_bits)
+        return (bit @ (1 << np.arange(self.n_bits)).astype(np.int32)).T.astype(np.int32)
+
+    def _tambah_baris(self, vectors):
+        n = len(self.kelompok) - len(vectors)
+        if self._matrix is None:
+            rng = np.random.default_rng(self.seed)
+            self._planes = rng.standard_normal((vectors.shape[1], self.n_tabel * self.n_bits)).astype(np.float32)
+            self._matrix = np.zeros((max(1024, len(vectors)), vectors.shape[1]), dtype=np.float32)
+            self._kode = np.zeros((self.n_tabel, len(self._matrix)), dtype=np.int32)
+        if n + len(vectors) > len(self._matrix):
+            # Kapasitas digandakan supaya penambahan case tetap amortized O(1)
+            kapasitas = max(2 * len(self._matrix), n + len(vectors))
+            self._matrix = np.concatenate([self._matrix[:n], np.zeros((kapasitas - n, self._matrix.shape[1]), dtype=np.float32)])
+            self._kode = np.concatenate([self._kode[:, :n], np.zeros((self.n_tabel, kapasitas - n), dtype=np.int32)], axis=1)
+        self._matrix[n:n + len(vectors)] = vectors
+        self._kode[:, n:n + len(vectors)] = self._kode_lsh(vectors)
+
+        # Bucket diurutkan ulang hanya kalau ekor yang belum terurut sudah cukup panjang
+        n = len(self.kelompok)
+        if n > self.batas_eksak and n - self.n_terurut > max(4096, self.n_terurut // 8):
+            kode = (self._kode[:, :n] + (np.arange(self.n_tabel, dtype=np.int32) << self.n_bits)[:, None]).ravel()
+            urutan = np.argsort(kode, kind="stable")
+            self._terurut = (kode[urutan], (urutan % n).astype(np.int32))
+            self.n_terurut = n
+
+    def tambah(self, cases):
+        vectors = []
+        for case in cases:
+            keywords = case.get("crs_keywords", [])
+            preferensi_label = case.get("preferensi_label", {})
+            key = fingerprint_case(keywords, preferensi_label)
+            if key is None:
+                continue
+
+            if key not in self.fingerprint_id:
+                vectors.append(self.embed(keywords, preferensi_label))
+                self.fingerprint_id[key] = len(self.kelompok)
+                self.kelompok.append([])
+            self.kelompok[self.fingerprint_id[key]].append(case)
+            self.n_case += 1
+
+        if vectors:
+            self._tambah_baris(np.vstack(vectors))
+
+    def _kandidat_lsh(self, query, n):
+        # Multi-probe: bucket query plus bucket yang berbeda satu bit (tetangga Hamming)
+        kode_query = self._kode_lsh(query.reshape(1, -1))[:, 0]
+        probe = kode_query[:, None] ^ np.r_[0, 1 << np.arange(self.n_bits)].astype(np.int32)
+        kode_urut, urutan = self._terurut
+
+        # Semua tabel disimpan berurutan dalam satu array (kode dinaikkan t << n_bits),
+        # jadi rentang bucket dari semua tabel & probe dicari dengan satu searchsorted
+        probe = (probe + (np.arange(self.n_tabel, dtype=np.int32) << self.n_bits)[:, None]).ravel()
+        awal = np.searchsorted(kode_urut, probe)
+        panjang = np.searchsorted(kode_urut, probe, side="right") - awal
+        posisi = np.repeat(awal - np.cumsum(panjang) + panjang, panjang) + np.arange(panjang.sum())
+        kandidat = [urutan[posisi]]
+
+        # Baris yang ditambahkan setelah pengurutan terakhir dicek langsung, dengan kode yang
+        # dinaikkan t << n_bits seperti di atas supaya hanya cocok dengan probe tabelnya sendiri
+        if n > self.n_terurut:
+            kode_ekor = self._kode[:, self.n_terurut:n] + (np.arange(self.n_tabel, dtype=np.int32) << self.n_bits)[:, None]
+            ekor = np.isin(kode_ekor, probe).any(axis=0)
+            kandidat.append(self.n_terurut + np.flatnonzero(ekor).astype(np.int32))
+        return np.unique(np.concatenate(kandidat))
+
+    def search_idx(self, query, k=5, mode=None):
+        # query = hasil embed(); mode None: otomatis (eksak sampai batas_eksak), "exact" atau "lsh"
+        n = len(self.kelompok)
+        if n == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        k = min(k, n)
+
+        if mode == "lsh" or (mode is None and self.n_terurut > 0):
+            kandidat = self._kandidat_lsh(query, n) if self.n_terurut > 0 else np.empty(0, dtype=np.int32)
+            # Kandidat terlalu sedikit -> jatuh ke pencarian eksak
+            if len(kandidat) >= k:
+                return _top_k(self._matrix[kandidat] @ query, kandidat, k)
+
+        scores = self._matrix[:n] @ query
+        return _top_k(scores, np.arange(n), k)
+
+    def cari(self, keywords, preferensi_label, k=5, mode=None):
+        # -> [(skor, [case, ...])] untuk k fingerprint paling mirip
+        with self._lock:
+            idx, scores = self.search_idx(self.embed(keywords, preferensi_label), k, mode)
+            return [(float(s), list(self.kelompok[i])) for i, s in zip(idx, scores)]
+
+    def kafe_pilihan_serupa(self, keywords, preferensi_label, k=5, skor_min=0.0):
+        # Kafe yang dipilih user dengan preferensi mirip: [(nama, jumlah, skor_terbaik)]
+        ringkasan = {}
+        for skor, cases in self.cari(keywords, preferensi_label, k):
+            if skor <= skor_min:
+                continue
+            for case in cases:
+                nama = case.get("selected_kafe")
+                if not nama:
+                    continue
+                jumlah, skor_terbaik = ringkasan.get(nama, (0, skor))
+                ringkasan[nama] = (jumlah + 1, max(skor_terbaik, skor))
+        return sorted(
+            [(nama, jumlah, skor) for nama, (jumlah, skor) in ringkasan.items()],
+            key=lambda x: (-x[2], -x[1])
+        )
+
+
+def buat_case_sintetis(n, kategori_suasana, rng, n_kafe=200):
+    # Seperti di app: paling banyak satu sub-label per kategori, keyword = gabungan keyword sub-label
+    kategori = list(kategori_suasana.items())
+    cases = []
+    for _ in range(n):
+        preferensi_label, keywords = {}, []
+        for i in rng.choice(len(kategori), size=rng.integers(1, 6), replace=False):
+            nama_kategori, sub_dict = kategori[i]
+            sub_label = list(sub_dict)[rng.integers(len(sub_dict))]
+            preferensi_label[nama_kategori] = sub_label
+            keywords += sub_dict[sub_label]
+        cases.append({"crs_keywords": keywords, "preferensi_label": preferensi_label,
+                      "selected_kafe": f"Kafe {rng.integers(n_kafe)}"})
+    return cases
+
+
+if __name__ == "__main__":
+    from kategori_suasana_dict_updated import kategori_suasana
+
+    parser = argparse.ArgumentParser(description="Benchmark k-nearest case retrieval dengan casebase sintetis.")
+    parser.add_argument("--ukuran", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--n-query", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Vektor keyword acak sebagai pengganti model Word2Vec
+    rng = np.random.default_rng(args.seed)
+    semua_keyword = {k for sub_dict in kategori_suasana.values() for kws in sub_dict.values() for k in kws}
+    wv = {k: rng.standard_normal(100).astype(np.float32) for k in semua_keyword}
+    sub_labels = [sub_label for sub_dict in kategori_suasana.values() for sub_label in sub_dict]
+
+    def query_vector(keywords):
+        vectors = [wv[k] for k in keywords if k in wv]
+        return np.mean(vectors, axis=0).reshape(1, -1) if vectors else np.zeros((1, 100))
+
+    for n in args.ukuran:
+        cases = buat_case_sintetis(n, kategori_suasana, rng)
+        queries = buat_case_sintetis(args.n_query, kategori_suasana, rng)
+
+        retrieval = CaseRetrieval(query_vector, sub_labels)
+        t0 = time.perf_counter()
+        retrieval.tambah(cases)
+        t_build = time.perf_counter() - t0
+
+        # Waktu cari tanpa embed query (di app vektor query sudah di-cache)
+        hasil = {}
+        for mode in ["exact", "lsh"]:
+            waktu, hasil[mode] = [], []
+            for q in queries:
+                query = retrieval.embed(q["crs_keywords"], q["preferensi_label"])
+                t0 = time.perf_counter()
+                idx, _ = retrieval.search_idx(query, args.k, mode=mode)
+                waktu.append(time.perf_counter() - t0)
+                hasil[mode].append(set(idx.tolist()))
+            hasil[mode + "_ms"] = 1000 * np.median(waktu)
+
+        recall = np.mean([len(a & b) / len(a) for a, b in zip(hasil["exact"], hasil["lsh"])])
+        print(f"{n:>9} case ({len(retrieval.kelompok)} fingerprint unik) | build {t_build:.1f} s | "
+              f"exact {hasil['exact_ms']:.3f} ms | lsh {hasil['lsh_ms']:.3f} ms (recall@{args.k} {recall:.2f})")
@@ -0,0 +1,344 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from kafe_engine import MODE_EMBEDDING, MODEL_PATH, WORD2VEC_CACHE_DIR, hitung_bobot_token
+from review_cache import CACHE_DIR, SOURCE_PATH
+from vocabulary import LIBRARY_PATH
+
+
+# Hasil builder: vectors.npy (float32, n_kafe x dim) + avg_sentiment.npy bisa dibuka dengan
+# np.load(mmap_mode="r"); meta.json (urutan nama kafe) ditulis terakhir.
+# Mode idf/sif ditulis ke folder sendiri (case_vectors_idf, ...) supaya bisa dibandingkan berdampingan
+OUTPUT_DIR = "data/cache/case_vectors"
+
+# Diisi sekali per proses worker (initializer), supaya array besar tidak ikut di-pickle per shard
+_worker = {}
+
+
+def peta_token_ke_model(vocab, key_to_index):
+    # id token vocab -> baris di model.wv.vectors (-1 kalau tidak ada di model)
+    return np.fromiter((key_to_index.get(t, -1) for t in vocab.id_to_token), dtype=np.int64, count=len(vocab))
+
+
+def dir_embedding(embedding="rata", output_dir=OUTPUT_DIR):
+    return output_dir if embedding == "rata" else f"{output_dir}_{embedding}"
+
+
+def frekuensi_token(review_tokens, n_vocab, mode="sif"):
+    # Dari korpus review: jumlah kemunculan (sif) atau jumlah review yang memuat token (idf)
+    ids = np.asarray(review_tokens.ids, dtype=np.int64)
+    if mode != "idf":
+        return np.bincount(ids, minlength=n_vocab), len(ids)
+    pasangan = np.unique(review_tokens.baris_per_token() * n_vocab + ids)
+    return np.bincount(pasangan % n_vocab, minlength=n_vocab), len(review_tokens)
+
+
+def hitung_bobot_model(vocab, model_idx, n_model, embedding, review_tokens=None):
+    # Bobot per baris model.wv.vectors. Sumber frekuensi: korpus review kalau diberikan, kalau
+    # tidak tokens_library.txt (hanya berisi jumlah kemunculan, jadi idf-nya memakai frekuensi
+    # token sebagai pengganti frekuensi dokumen). Kata model di luar vocab dianggap frekuensi 0
+    if review_tokens is not None:
+        frekuensi, total = frekuensi_token(review_tokens, len(vocab), embedding)
+    else:
+        # Token tambahan (OOV library) tidak punya frekuensi -> 0
+        frekuensi = np.zeros(len(vocab), dtype=np.int64)
+        frekuensi[:vocab.n_library] = vocab.freq[:vocab.n_library]
+        total = int(frekuensi.sum())
+
+    frekuensi_model = np.zeros(n_model, dtype=np.int64)
+    ada = model_idx >= 0
+    frekuensi_model[model_idx[ada]] = frekuensi[ada]
+    return hitung_bobot_token(frekuensi_model, total, embedding)
+
+
+def _init_worker(ids_path, offsets_path, vectors_path, model_idx, bobot_model=None):
+    # Tiap worker membuka file yang sama dengan memory-map: page cache dipakai bersama
+    _worker["ids"] = np.load(ids_path, mmap_mode="r")
+    _worker["offsets"] = np.load(offsets_path, mmap_mode="r")
+    _worker["vectors"] = np.load(vectors_path, mmap_mode="r")
+    _worker["model_idx"] = model_idx
+    _worker["bobot_model"] = bobot_model
+
+
+def _hitung_shard(review_idx, kafe_lokal, n_kafe):
+    # Rata-rata (berbobot) vektor token yang ada di model per kafe untuk satu shard.
+    # review_idx sudah terurut per kafe, kafe_lokal = nomor kafe di dalam shard (0..n_kafe-1)
+    from scipy.sparse import csr_matrix
+
+    ids, offsets, vectors = _worker["ids"], _worker["offsets"], _worker["vectors"]
+    awal = offsets[review_idx]
+    panjang = offsets[review_idx + 1] - awal
+    n_token = int(panjang.sum())
+
+    # Posisi semua token milik review di shard ini, tanpa loop per review
+    geser = np.repeat(awal - (np.cumsum(panjang) - panjang), panjang)
+    model_idx = _worker["model_idx"][ids[geser + np.arange(n_token, dtype=np.int64)]]
+    baris = np.repeat(kafe_lokal, panjang)
+    ada = model_idx >= 0
+
+    # review_idx terurut per kafe -> token juga sudah terkelompok per baris: CSR bisa dibentuk
+    # langsung tanpa sorting (duplikat kolom dibiarkan, ikut terjumlah saat perkalian)
+    model_idx, baris = model_idx[ada], baris[ada]
+    n_vektor = np.bincount(baris, minlength=n_kafe)
+    indptr = np.r_[0, np.cumsum(n_vektor)]
+    if _worker["bobot_model"] is None:
+        data, total_bobot = np.ones(len(model_idx), dtype=np.float32), n_vektor
+    else:
+        data = _worker["bobot_model"][model_idx]
+        total_bobot = np.bincount(baris, weights=data, minlength=n_kafe)
+    counts = csr_matrix((data, model_idx, indptr), shape=(n_kafe, len(vectors)))
+    jumlah = counts @ vectors
+    return (jumlah / np.where(total_bobot > 0, total_bobot, 1)[:, None]).astype(np.float32), n_vektor
+
+
+def _bagi_shard(kafe_codes, panjang, n_kafe, n_shard):
+    # Kafe dibagi ke shard berurutan dengan jumlah token kira-kira sama (satu kafe tidak dipecah)
+    urutan = np.argsort(kafe_codes, kind="stable")
+    token_per_kafe = np.bincount(kafe_codes, weights=panjang, minlength=n_kafe)
+    batas_kafe = np.searchsorted(np.cumsum(token_per_kafe), np.linspace(0, token_per_kafe.sum(), n_shard + 1)[1:-1])
+    batas_kafe = np.unique(np.r_[0, batas_kafe, n_kafe])
+    batas_review = np.searchsorted(kafe_codes[urutan], batas_kafe)
+
+    shards = []
+    for k0, k1, r0, r1 in zip(batas_kafe[:-1], batas_kafe[1:], batas_review[:-1], batas_review[1:]):
+        review_idx = urutan[r0:r1]
+        shards.append((k0, k1, review_idx, (kafe_codes[review_idx] - k0).astype(np.int32)))
+    return shards
+
+
+def hitung_vektor_kafe(ids_path, offsets_path, vectors_path, model_idx, kafe_codes, n_kafe, n_proses=None,
+                       shard_per_proses=4, bobot_model=None):
+    # -> (vektor float32 n_kafe x dim, jumlah token yang punya vektor per kafe).
+    # kafe_codes: nomor kafe per review (-1 = review tanpa nama kafe, dilewati);
+    # bobot_model: bobot per baris model (None = rata-rata biasa)
+    n_proses = n_proses or os.cpu_count() or 1
+    offsets = np.load(offsets_path, mmap_mode="r")
+    dim = np.load(vectors_path, mmap_mode="r").shape[1]
+
+    ada = kafe_codes >= 0
+    review_idx = np.flatnonzero(ada)
+    shards = _bagi_shard(kafe_codes[ada], np.diff(offsets)[ada], n_kafe, n_proses * shard_per_proses)
+    tugas = [(review_idx[idx], lokal, k1 - k0) for k0, k1, idx, lokal in shards]
+
+    init_args = (ids_path, offsets_path, vectors_path, model_idx, bobot_model)
+    if n_proses == 1:
+        _init_worker(*init_args)
+        hasil = [_hitung_shard(*t) for t in tugas]
+    else:
+        with ProcessPoolExecutor(n_proses, initializer=_init_worker, initargs=init_args) as pool:
+            hasil = list(pool.map(_hitung_shard, *zip(*tugas)))
+
+    vektor = np.zeros((n_kafe, dim), dtype=np.float32)
+    n_vektor = np.zeros(n_kafe, dtype=np.int64)
+    for (k0, k1, *_), (v, n) in zip(shards, hasil):
+        vektor[k0:k1] = v
+        n_vektor[k0:k1] = n
+    return vektor, n_vektor
+
+
+def hitung_sentimen_kafe(df, kafe_codes, n_kafe, kolom_sentimen=None):
+    # Rata-rata skor sentimen review per kafe (NaN kalau kolom tidak ada / kafe tanpa skor)
+    if not kolom_sentimen or kolom_sentimen not in df:
+        return np.full(n_kafe, np.nan)
+    sentimen = pd.to_numeric(df[kolom_sentimen], errors="coerce").to_numpy(dtype=np.float64)
+    ada = (kafe_codes >= 0) & ~np.isnan(sentimen)
+    jumlah = np.bincount(kafe_codes[ada], weights=sentimen[ada], minlength=n_kafe)
+    n = np.bincount(kafe_codes[ada], minlength=n_kafe)
+    return np.where(n > 0, jumlah / np.maximum(n, 1), np.nan)
+
+
+def simpan_case_vector(output_dir, daftar_kafe, vektor, avg_sentiment, n_vektor, sumber=None,
+                       embedding="rata", bobot_model=None):
+    os.makedirs(output_dir, exist_ok=True)
+    if bobot_model is not None:
+        np.save(os.path.join(output_dir, "bobot_model.npy"), np.asarray(bobot_model, dtype=np.float32))
+    np.save(os.path.join(output_dir, "vectors.npy"), np.ascontiguousarray(vektor, dtype=np.float32))
+    np.save(os.path.join(output_dir, "avg_sentiment.npy"), np.asarray(avg_sentiment, dtype=np.float64))
+    np.save(os.path.join(output_dir, "n_vektor.npy"), np.asarray(n_vektor, dtype=np.int64))
+
+    # Meta ditulis terakhir, jadi hasil yang setengah jadi tidak akan terbaca
+    meta = {"daftar_kafe": list(daftar_kafe), "dim": int(vektor.shape[1]), "embedding": embedding,
+            "sumber": sumber or {}}
+    with open(os.path.join(output_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+def load_case_vector(output_dir=OUTPUT_DIR, mmap=True):
+    # -> DataFrame format case_vector_df.pkl (Nama Kafe, dim_*, avg_sentiment).
+    # Kafe tanpa token yang ada di model tidak punya vektor, dilewati seperti di review_ingest
+    with open(os.path.join(output_dir, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    mmap_mode = "r" if mmap else None
+    vektor = np.load(os.path.join(output_dir, "vectors.npy"), mmap_mode=mmap_mode)
+    avg_sentiment = np.load(os.path.join(output_dir, "avg_sentiment.npy"), mmap_mode=mmap_mode)
+    ada = np.load(os.path.join(output_dir, "n_vektor.npy")) > 0
+
+    df = pd.DataFrame(vektor[ada], columns=[f"dim_{i}" for i in range(meta["dim"])])
+    df.insert(0, "Nama Kafe", np.asarray(meta["daftar_kafe"], dtype=object)[ada])
+    df["avg_sentiment"] = avg_sentiment[ada]
+    return df
+
+
+def load_bobot_model(output_dir=OUTPUT_DIR):
+    # Bobot token untuk vektor query, sama dengan yang dipakai membangun case vector (None = rata)
+    with open(os.path.join(output_dir, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("embedding", "rata") == "rata":
+        return None
+    return np.load(os.path.join(output_dir, "bobot_model.npy"))
+
+
+def _sidik_sumber_cache(meta_path):
+    # Sidik file sumber yang tercatat di meta.json cache review / KeyedVectors. File sumbernya
+    # sendiri boleh tidak ada (deploy hanya dengan cache), cache tetap dipakai apa adanya
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f)["source"]
+
+
+def bangun_case_vector(source_path=SOURCE_PATH, cache_dir=CACHE_DIR, library_path=LIBRARY_PATH,
+                       model_path=MODEL_PATH, w2v_cache_dir=WORD2VEC_CACHE_DIR, output_dir=OUTPUT_DIR,
+                       kolom_sentimen=None, n_proses=None, embedding="rata", sumber_bobot="review"):
+    # Dari cache review biner (review_cache) & KeyedVectors mmap (word_vectors): keduanya
+    # sudah berupa file .npy, jadi worker tinggal membukanya sendiri
+    from review_cache import _path_cache, load_review_cache
+    from word_vectors import _path_cache as _path_cache_w2v, load_keyed_vectors
+
+    df, review_tokens, vocab = load_review_cache(source_path, cache_dir, library_path)
+    model = load_keyed_vectors(model_path, w2v_cache_dir)
+    model_idx = peta_token_ke_model(vocab, model.key_to_index)
+    bobot_model = None
+    if embedding != "rata":
+        bobot_model = hitung_bobot_model(vocab, model_idx, len(model), embedding,
+                                         review_tokens if sumber_bobot == "review" else None)
+
+    # Urutan kafe sama dengan buat_kafe_token_matrix
+    daftar_kafe = sorted(df["Nama Kafe"].dropna().unique())
+    kafe_codes = pd.Categorical(df["Nama Kafe"], categories=daftar_kafe).codes.astype(np.int64)
+
+    vektor, n_vektor = hitung_vektor_kafe(
+        _path_cache(cache_dir, "token_ids.npy"), _path_cache(cache_dir, "token_offsets.npy"),
+        _path_cache_w2v(w2v_cache_dir, "word_vectors.kv.vectors.npy"), model_idx, kafe_codes, len(daftar_kafe),
+        n_proses, bobot_model=bobot_model
+    )
+    avg_sentiment = hitung_sentimen_kafe(df, kafe_codes, len(daftar_kafe), kolom_sentimen)
+    sumber = {"review": _sidik_sumber_cache(_path_cache(cache_dir, "meta.json")),
+              "model": _sidik_sumber_cache(_path_cache_w2v(w2v_cache_dir, "meta.json")), "kolom_sentimen": kolom_sentimen,
+              "bobot": sumber_bobot if embedding != "rata" else None}
+    return simpan_case_vector(output_dir, daftar_kafe, vektor, avg_sentiment, n_vektor, sumber,
+                              embedding, bobot_model)
+
+
+def evaluasi_embedding(dirs, model, k=5):
+    # Perbandingan offline antar mode embedding, query = keyword tiap sub-label kategori_suasana:
+    # - cos_antar_kafe: rata-rata cosine antar kafe (tinggi = vektor kafe mirip semua)
+    # - sebaran_skor: rata-rata std skor similarity per query (rendah = skor datar)
+    # - irisan_top_k: irisan top-k dengan mode pertama di dirs
+    from kafe_engine import VektorKata
+    from similarity_search import normalisasi
+
+    hasil, top_acuan = [], None
+    for output_dir in dirs:
+        df = load_case_vector(output_dir)
+        matrix = normalisasi(df.filter(like="dim_").to_numpy(dtype=np.float32))
+        names = df["Nama Kafe"].to_numpy()
+        vektor_kata = VektorKata(model, bobot=load_bobot_model(output_dir))
+
+        rata_vektor = matrix.mean(axis=0)
+        n = len(matrix)
+        cos_antar_kafe = (n * n * float(rata_vektor @ rata_vektor) - n) / max(n * (n - 1), 1)
+
+        sebaran, top = [], []
+        for keywords in vektor_kata.sub_keywords.values():
+            skor = matrix @ normalisasi(vektor_kata.query_vector(keywords))[0]
+            sebaran.append(float(skor.std()))
+            top.append(set(names[np.argsort(-skor, kind="stable")[:k]]))
+        top_acuan = top_acuan or top
+        hasil.append({
+            "dir": output_dir,
+            "cos_antar_kafe": cos_antar_kafe,
+            "sebaran_skor": float(np.mean(sebaran)),
+            "irisan_top_k": float(np.mean([len(a & b) / k for a, b in zip(top, top_acuan)]))
+        })
+    return hasil
+
+
+def _corpus_sintetis(tmp, n_review, n_kafe, n_vocab, dim, rng, panjang_rata=40):
+    # Token id langsung (tanpa DataFrame list token) supaya korpus jutaan review cepat dibuat
+    panjang = np.maximum(rng.poisson(panjang_rata, size=n_review), 1)
+    offsets = np.r_[0, np.cumsum(panjang)].astype(np.int64)
+    peluang = 1.0 / np.arange(1, n_vocab + 1)  # kira-kira Zipf, seperti frekuensi token asli
+    ids = rng.choice(n_vocab, size=int(offsets[-1]), p=peluang / peluang.sum()).astype(np.int32)
+
+    paths = {nama: os.path.join(tmp, f"{nama}.npy") for nama in ["ids", "offsets", "vectors"]}
+    np.save(paths["ids"], ids)
+    np.save(paths["offsets"], offsets)
+    np.save(paths["vectors"], rng.standard_normal((n_vocab, dim)).astype(np.float32))
+    # ~10% token tidak ada di model (OOV)
+    model_idx = np.where(rng.random(n_vocab) < 0.1, -1, np.arange(n_vocab))
+    kafe_codes = rng.integers(n_kafe, size=n_review)
+    return paths, model_idx, kafe_codes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bangun ulang case vector (rata-rata vektor Word2Vec token review per kafe).")
+    parser.add_argument("--source", default=SOURCE_PATH)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--library", default=LIBRARY_PATH)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", help=f"default {OUTPUT_DIR}, atau {OUTPUT_DIR}_<embedding> untuk idf/sif")
+    parser.add_argument("--embedding", choices=MODE_EMBEDDING, default="rata")
+    parser.add_argument("--sumber-bobot", choices=["review", "library"], default="review",
+                        help="frekuensi token untuk bobot idf/sif: korpus review atau tokens_library.txt")
+    parser.add_argument("--kolom-sentimen", default=None, help="kolom skor sentimen per review (opsional)")
+    parser.add_argument("--proses", type=int, nargs="+", default=[os.cpu_count() or 1])
+    parser.add_argument("--pkl", help="tulis juga DataFrame format case_vector_df.pkl ke path ini")
+    parser.add_argument("--evaluasi", nargs="+", metavar="DIR", help="bandingkan hasil builder (mode embedding) yang sudah ada")
+    parser.add_argument("--sintetis", type=int, metavar="N_REVIEW",
+                        help="ukur skala per jumlah proses dengan korpus sintetis, tanpa menulis output")
+    parser.add_argument("--n-kafe", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    output_dir = args.output or dir_embedding(args.embedding)
+
+    if args.evaluasi:
+        from word_vectors import load_keyed_vectors
+
+        for h in evaluasi_embedding(args.evaluasi, load_keyed_vectors(args.model, WORD2VEC_CACHE_DIR)):
+            print(f"{h['dir']:<32} cos antar kafe {h['cos_antar_kafe']:.6f} | sebaran skor {h['sebaran_skor']:.2e} | "
+                  f"irisan top-k {h['irisan_top_k']:.2f}")
+    elif args.sintetis:
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as tmp:
+            rng = np.random.default_rng(args.seed)
+            paths, model_idx, kafe_codes = _corpus_sintetis(tmp, args.sintetis, args.n_kafe, 50000, 100, rng)
+            bobot_model = None
+            if args.embedding != "rata":
+                # Frekuensi Zipf sesuai _corpus_sintetis
+                frekuensi = 1e6 / np.arange(1, 50001)
+                bobot_model = hitung_bobot_token(frekuensi, frekuensi.sum(), args.embedding)
+            acuan = None
+            for n_proses in args.proses:
+                t0 = time.perf_counter()
+                vektor, _ = hitung_vektor_kafe(paths["ids"], paths["offsets"], paths["vectors"], model_idx,
+                                               kafe_codes, args.n_kafe, n_proses, bobot_model=bobot_model)
+                waktu = time.perf_counter() - t0
+                acuan = acuan or (waktu, vektor)
+                print(f"{n_proses:>3} proses: {waktu:.2f} s  x{acuan[0] / waktu:.2f}  "
+                      f"(selisih maks {np.abs(vektor - acuan[1]).max():.1e})")
+    else:
+        t0 = time.perf_counter()
+        meta = bangun_case_vector(args.source, args.cache_dir, args.library, args.model, output_dir=output_dir,
+                                  kolom_sentimen=args.kolom_sentimen, n_proses=args.proses[0],
+                                  embedding=args.embedding, sumber_bobot=args.sumber_bobot)
+        print(f"{len(meta['daftar_kafe'])} kafe ({args.embedding}) -> {output_dir} ({time.perf_counter() - t0:.2f} s)")
+        if args.pkl:
+            load_case_vector(output_dir, mmap=False).to_pickle(args.pkl)
+            print(f"DataFrame: {args.pkl}")
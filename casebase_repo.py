@@ -0,0 +1,310 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+# Kolom yang disimpan di sheet sebagai string JSON
+JSON_COLS = ["crs_keywords", "preferensi_label", "refine_added", "refine_excluded", "user_identity"]
+# Kolom teknis di sheet yang bukan bagian case (row_id ditulis oleh SheetOutbox untuk dedup)
+KOLOM_ABAIKAN = {"row_id"}
+
+
+def numerize(value):
+    # Sama seperti numericise pygsheets (get_as_df(numerize=True) di reader lama):
+    # string angka jadi int, lalu float; selain itu apa adanya
+    if isinstance(value, str) and value != "":
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    return value
+
+
+def parse_case(record):
+    case = {k: numerize(v) for k, v in record.items() if k not in KOLOM_ABAIKAN}
+    for col in JSON_COLS:
+        x = case.get(col)
+        if isinstance(x, str) and x.strip() and (x.strip().startswith("{") or x.strip().startswith("[")):
+            try:
+                case[col] = json.loads(x)
+            except ValueError:
+                pass  # fallback kalau gagal parsing
+    return case
+
+
+def fingerprint_case(keywords, preferensi_label):
+    # Kunci kanonik: keyword terurut + label (kategori -> sub) yang dinormalisasi.
+    # Label yang bukan dict tidak akan pernah cocok dengan query, jadi hasilnya None
+    if not isinstance(preferensi_label, dict):
+        return None
+    try:
+        return tuple(sorted(keywords)), tuple(sorted((str(k), str(v)) for k, v in preferensi_label.items()))
+    except TypeError:
+        return None
+
+
+class CaseIndex:
+    # Hash index fingerprint -> semua case dengan fingerprint itu (urutan sesuai casebase)
+    def __init__(self, cases=()):
+        self._index = {}
+        self.tambah(cases)
+
+    def tambah(self, cases):
+        for case in cases:
+            key = fingerprint_case(case.get("crs_keywords", []), case.get("preferensi_label", {}))
+            if key is not None:
+                self._index.setdefault(key, []).append(case)
+
+    def cari(self, keywords, preferensi_label):
+        hasil = self.cari_semua(keywords, preferensi_label)
+        return hasil[0] if hasil else None
+
+    def cari_semua(self, keywords, preferensi_label):
+        key = fingerprint_case(keywords, preferensi_label)
+        return list(self._index.get(key, [])) if key is not None else []
+
+
+class IncrementalCaseIndex:
+    # Basis index turunan casebase yang menarik case baru dari CasebaseRepository:
+    # hanya case yang ditambahkan sejak perbarui() terakhir yang diproses.
+    # Subclass (PopularityTable, CaseRetrieval) mengisi index lewat tambah(cases) dan
+    # mengosongkannya lewat _reset()
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.generasi = None
+        self.n_case_terbaca = 0
+
+    def perbarui(self, repo):
+        # Kalau repo dimuat ulang penuh (generasi berubah), index dibangun ulang
+        generasi, cases = repo.generasi, repo.semua_case()
+        with self._lock:
+            if generasi != self.generasi:
+                self._reset()
+                self.generasi = generasi
+            if len(cases) > self.n_case_terbaca:
+                self.tambah(cases[self.n_case_terbaca:])
+                self.n_case_terbaca = len(cases)
+
+
+class PopularityTable(IncrementalCaseIndex):
+    # Berapa kali tiap kafe dipilih (selected_kafe) per sub-label preferensi (kafe x sub-label)
+    def __init__(self, names, sub_labels):
+        self.row_of = {nama: i for i, nama in enumerate(names)}
+        self.label_id = {sub_label: i for i, sub_label in enumerate(sub_labels)}
+        super().__init__()
+
+    def _reset(self):
+        super()._reset()
+        self.counts = np.zeros((len(self.row_of), len(self.label_id)), dtype=np.float32)
+        self.total = np.zeros(len(self.label_id), dtype=np.float32)
+
+    def tambah(self, cases):
+        for case in cases:
+            i = self.row_of.get(case.get("selected_kafe"))
+            preferensi_label = case.get("preferensi_label")
+            if i is None or not isinstance(preferensi_label, dict):
+                continue
+            for sub_label in preferensi_label.values():
+                j = self.label_id.get(sub_label)
+                if j is not None:
+                    self.counts[i, j] += 1
+                    self.total[j] += 1
+
+    def skor(self, sub_labels):
+        # Rata-rata porsi pemilihan tiap kafe untuk sub-label yang diminta (0..1), urut seperti names
+        cols = [self.label_id[s] for s in sub_labels if s in self.label_id]
+        if not cols:
+            return np.zeros(len(self.row_of), dtype=np.float32)
+        with self._lock:
+            return (self.counts[:, cols] / np.maximum(self.total[cols], 1)).mean(axis=1)
+
+
+class LocalWorksheet:
+    # Pengganti worksheet pygsheets berbasis file JSON (baris pertama = header),
+    # untuk testing / local dev tanpa koneksi ke Google Sheets
+    def __init__(self, path, header=None):
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._tulis([list(header)] if header else [])
+
+    def _baca(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _tulis(self, rows):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def refresh(self, update_grid=False):
+        pass
+
+    @property
+    def rows(self):
+        return len(self._baca())
+
+    @property
+    def cols(self):
+        return max((len(r) for r in self._baca()), default=0)
+
+    def get_row(self, row, include_tailing_empty=False, **kwargs):
+        rows = self._baca()
+        values = list(rows[row - 1]) if row <= len(rows) else []
+        while values and values[-1] == "" and not include_tailing_empty:
+            values.pop()
+        return values
+
+    def get_col(self, col, include_tailing_empty=True, **kwargs):
+        values = [row[col - 1] if col <= len(row) else "" for row in self._baca()]
+        while values and values[-1] == "" and not include_tailing_empty:
+            values.pop()
+        return values
+
+    def get_values(self, start, end, include_tailing_empty_rows=False, **kwargs):
+        rows = self._baca()
+        return [list(r[start[1] - 1:end[1]]) for r in rows[start[0] - 1:end[0]]]
+
+    def add_cols(self, cols):
+        # Grid file JSON tidak berukuran tetap; cukup lebarkan baris pertama
+        rows = self._baca()
+        if rows:
+            rows[0].extend([""] * cols)
+            self._tulis(rows)
+
+    def update_value(self, addr, val, **kwargs):
+        rows = self._baca()
+        baris, kolom = addr
+        rows.extend([] for _ in range(baris - len(rows)))
+        rows[baris - 1].extend([""] * (kolom - len(rows[baris - 1])))
+        rows[baris - 1][kolom - 1] = str(val)
+        self._tulis(rows)
+
+    def append_table(self, values, dimension="ROWS", **kwargs):
+        rows = self._baca()
+        values = values if values and isinstance(values[0], list) else [values]
+        rows.extend([[str(v) for v in row] for row in values])
+        self._tulis(rows)
+
+    def get_as_df(self, **kwargs):
+        import pandas as pd
+        rows = self._baca()
+        return pd.DataFrame(rows[1:], columns=rows[0]) if rows else pd.DataFrame()
+
+
+class CasebaseRepository:
+    # Salinan lokal casebase (JSON-lines) yang disinkronkan bertahap dari sheet:
+    # hanya baris yang ditambahkan sejak sync terakhir yang diambil
+    def __init__(self, get_worksheet, local_path, ttl=300):
+        self.get_worksheet = get_worksheet
+        self.local_path = local_path
+        self.ttl = ttl
+
+        self.header = None
+        self._records = []  # baris mentah (string) persis seperti di sheet
+        self._cases = []  # hasil parse_case, dipakai oleh app
+        self.index = CaseIndex()
+        # Naik setiap kali casebase dimuat ulang penuh (bukan sekadar ditambah di belakang)
+        self.generasi = 0
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+        self._sync_thread = None
+        self._sync_awal_dicoba = False
+        self.error_terakhir = None
+
+        self._muat_lokal()
+
+    def _muat_lokal(self):
+        if not os.path.exists(self.local_path):
+            return
+        with open(self.local_path, "r", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        if lines:
+            self.header = lines[0]["header"]
+            self._records = lines[1:]
+            self._cases = [parse_case(r) for r in self._records]
+            self.index = CaseIndex(self._cases)
+
+    def _tulis_lokal(self, records, mode="a"):
+        os.makedirs(os.path.dirname(self.local_path) or ".", exist_ok=True)
+        with open(self.local_path, mode, encoding="utf-8") as f:
+            if mode == "w":
+                f.write(json.dumps({"header": self.header}, ensure_ascii=False) + "\n")
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def __len__(self):
+        return len(self._records)
+
+    def semua_case(self):
+        # Belum ada salinan lokal (mis. pertama kali setelah deploy): sync pertama ditunggu
+        # sekali, supaya lookup CBR pertama tidak kosong. Setelah itu tidak pernah menunggu
+        # jaringan: pakai salinan lokal, sync di background jika basi
+        if self.header is None and not self._sync_awal_dicoba:
+            self._sync_awal_dicoba = True
+            self.sync()
+        elif time.time() - self._last_sync > self.ttl:
+            self.sync_background()
+        return self._cases
+
+    def sync_background(self):
+        if self._sync_thread is not None and self._sync_thread.is_alive():
+            return self._sync_thread
+        self._sync_thread = threading.Thread(target=self.sync, daemon=True)
+        self._sync_thread.start()
+        return self._sync_thread
+
+    def sync(self):
+        try:
+            with self._lock:
+                return self._sync()
+        except Exception as e:
+            self.error_terakhir = e
+            return 0
+
+    def _sync(self):
+        wks = self.get_worksheet()
+        header = wks.get_row(1, include_tailing_empty=False)
+        if not header:
+            return 0
+
+        # wks.rows adalah ukuran grid (default 1000 di pygsheets), bukan baris terakhir yang
+        # terisi -> jumlah baris terisi dihitung dari kolom pertama (selalu diisi, "N/A" kalau kosong)
+        n_baris = len(wks.get_col(1, include_tailing_empty=False))
+
+        # Header berubah atau baris di sheet berkurang -> ambil ulang semuanya
+        full = header != self.header or n_baris - 1 < len(self._records)
+        mulai = 2 if full else len(self._records) + 2
+
+        rows = []
+        if mulai <= n_baris:
+            rows = wks.get_values(start=(mulai, 1), end=(n_baris, len(header)), include_tailing_empty_rows=False)
+        baru = [dict(zip(header, list(row) + [""] * (len(header) - len(row)))) for row in rows]
+
+        if full:
+            self.header = header
+            self._tulis_lokal(baru, mode="w")
+            self._records = baru
+            self._cases = [parse_case(r) for r in baru]
+            self.index = CaseIndex(self._cases)
+            self.generasi += 1
+        else:
+            cases_baru = [parse_case(r) for r in baru]
+            self._tulis_lokal(baru)
+            self._records = self._records + baru
+            self._cases = self._cases + cases_baru
+            self.index.tambah(cases_baru)
+
+        self._last_sync = time.time()
+        self.error_terakhir = None
+        return len(baru)
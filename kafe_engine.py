@@ -0,0 +1,490 @@
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+import numpy as np
+
+from similarity_search import _top_k, buat_search_backend, normalisasi
+
+
+# Path data default (relatif ke root repo), sama seperti yang dipakai app
+REVIEW_PATH = "data/hasil_skor_dan_aspek.xlsx"
+REVIEW_CACHE_DIR = "data/cache/reviews"
+KAFE_VECTOR_PATH = "data/case_vector_df.pkl"
+MODEL_PATH = "data/word2vec_model.model"
+WORD2VEC_CACHE_DIR = "data/cache/word2vec"
+
+kata_kritik_umum = ["mahal", "rame", "berisik", "bising", "lambat", "pelayan_lama", "kotor",
+    "sempit", "panas", "gerah", "jutek", "antri", "macet", "crowded",
+    "tidak_bersih", "tidak_aman", "overpriced"]
+
+# Bobot porsi pemilihan kafe di casebase (0..1) yang ditambahkan ke FinalScore
+BOBOT_POPULARITAS = 0.1
+
+# Penalti per mention kata yang ingin dihindari saat refine
+BOBOT_PENALTI = 0.01
+
+# Ranker hybrid: kandidat dari indeks leksikal (ditambah sedikit dari search Word2Vec untuk
+# sinonim), lalu hanya kandidat yang di-skor ulang dengan case matrix.
+# Fusi "linear": BOBOT_LEKSIKAL * skor leksikal + (1 - BOBOT_LEKSIKAL) * similarity;
+# "rrf": reciprocal rank fusion dengan bobot yang sama
+N_KANDIDAT_LEKSIKAL = 100
+N_KANDIDAT_DENSE = 20
+BOBOT_LEKSIKAL = 0.5
+RRF_K = 60
+
+
+# Matriks sparse jumlah token per kafe (kafe x id token), dibangun sekali dari review
+def buat_kafe_token_matrix(df, review_tokens, vocab):
+    import pandas as pd
+    from scipy.sparse import csr_matrix
+
+    daftar_kafe = sorted(df["Nama Kafe"].dropna().unique())
+    kafe_codes = pd.Categorical(df["Nama Kafe"], categories=daftar_kafe).codes
+    rows = np.repeat(kafe_codes, review_tokens.panjang())
+    valid = rows >= 0
+
+    # Entri duplikat (kafe, token) otomatis dijumlahkan oleh csr_matrix
+    matrix = csr_matrix(
+        (np.ones(int(valid.sum()), dtype=np.int32), (rows[valid], review_tokens.ids[valid])),
+        shape=(len(daftar_kafe), len(vocab))
+    )
+
+    return {
+        "daftar_kafe": daftar_kafe,
+        "kafe_id": {nama: i for i, nama in enumerate(daftar_kafe)},
+        "vocab": vocab,
+        "matrix": matrix
+    }
+
+# Inverted index id token -> {kafe_id: jumlah}, diambil dari kolom matriks di atas
+def buat_token_index(kafe_token_matrix):
+    csc = kafe_token_matrix["matrix"].tocsc()
+
+    token_index = {}
+    for token_id in np.flatnonzero(np.diff(csc.indptr)):
+        start, end = csc.indptr[token_id], csc.indptr[token_id + 1]
+        token_index[int(token_id)] = dict(zip(csc.indices[start:end].tolist(), csc.data[start:end].tolist()))
+
+    return kafe_token_matrix["daftar_kafe"], token_index
+
+# Matriks case (dim_*) float32 ter-normalisasi + map nama kafe -> baris
+def buat_kafe_search(df_kafe, mode="exact"):
+    vector_cols = [col for col in df_kafe.columns if col.startswith("dim_")]
+    return buat_search_backend(df_kafe["Nama Kafe"], df_kafe[vector_cols].to_numpy(), mode=mode)
+
+def make_query_vector(keywords, model, vector_size=100, bobot=None):
+    # bobot: None -> rata-rata biasa; array sejajar model.key_to_index -> rata-rata berbobot
+    keywords = [k for k in keywords if k in model]
+    if not keywords:
+        return np.zeros((1, vector_size))
+    vectors = [model[k] for k in keywords]
+    if bobot is None:
+        return np.mean(vectors, axis=0).reshape(1, -1)
+    weights = bobot[[model.key_to_index[k] for k in keywords]]
+    return np.average(vectors, axis=0, weights=weights).reshape(1, -1)
+
+# Mode embedding kafe & query: rata (rata-rata biasa, seperti case_vector_df.pkl), idf, sif.
+# Token umum ("enak", "nya", "kopi") mendapat bobot kecil supaya tidak mendominasi vektor
+MODE_EMBEDDING = ("rata", "idf", "sif")
+SIF_A = 1e-3
+
+def hitung_bobot_token(frekuensi, total, mode="sif", a=SIF_A):
+    # frekuensi per token; total = jumlah semua token (sif) atau jumlah dokumen (idf)
+    frekuensi = np.asarray(frekuensi, dtype=np.float64)
+    if mode == "rata":
+        bobot = np.ones(len(frekuensi))
+    elif mode == "sif":
+        bobot = a / (a + frekuensi / max(total, 1))
+    elif mode == "idf":
+        bobot = np.log((1 + total) / (1 + frekuensi)) + 1
+    else:
+        raise ValueError(f"Mode embedding tidak dikenal: {mode} (pilih {', '.join(MODE_EMBEDDING)})")
+    return bobot.astype(np.float32)
+
+def hitung_mention_kafe(kafe_token_matrix, nama_kafe_list, kata_list):
+    # Jumlah kemunculan (kafe x kata) lewat satu slicing matriks sparse
+    kafe_ids = [kafe_token_matrix["kafe_id"].get(nama, -1) for nama in nama_kafe_list]
+    token_ids = [kafe_token_matrix["vocab"].id(k) for k in kata_list]
+
+    hasil = np.zeros((len(kafe_ids), len(token_ids)), dtype=np.int64)
+    baris = [i for i, kafe_id in enumerate(kafe_ids) if kafe_id >= 0]
+    kolom = [j for j, token_id in enumerate(token_ids) if token_id >= 0]
+
+    # Kafe tanpa review / kata yang tidak pernah muncul tetap bernilai 0
+    if baris and kolom:
+        sub_matrix = kafe_token_matrix["matrix"][[kafe_ids[i] for i in baris]][:, [token_ids[j] for j in kolom]]
+        hasil[np.ix_(baris, kolom)] = sub_matrix.toarray()
+
+    return hasil
+
+def skor_leksikal_kafe(token_index, vocab, preferensi_dict):
+    # -> (mention_per_kafe {kafe_id: {keyword: jumlah}}, subaspek_per_kafe {kafe_id: jumlah sub-aspek cocok})
+    # untuk semua kafe yang menyebut minimal satu keyword
+    _, index = token_index
+
+    # Hanya keyword yang dipilih yang di-lookup, bukan seluruh review
+    mention_per_kafe = defaultdict(dict)
+    subaspek_per_kafe = defaultdict(int)
+
+    for sub_label, keywords in preferensi_dict.items():
+        kafe_cocok = set()
+        for k in keywords:
+            for kafe_id, jumlah in index.get(vocab.id(k), {}).items():
+                mention_per_kafe[kafe_id][k] = jumlah
+                kafe_cocok.add(kafe_id)
+        for kafe_id in kafe_cocok:
+            subaspek_per_kafe[kafe_id] += 1
+    return mention_per_kafe, subaspek_per_kafe
+
+def cari_kafe_query_based(token_index, vocab, preferensi_dict, top_n=10):
+    daftar_kafe, _ = token_index
+    mention_per_kafe, subaspek_per_kafe = skor_leksikal_kafe(token_index, vocab, preferensi_dict)
+
+    kafe_dengan_skor = []
+    for kafe_id, subaspek_match_count in subaspek_per_kafe.items():
+        mention_dict = mention_per_kafe[kafe_id]
+        kafe_dengan_skor.append((daftar_kafe[kafe_id], mention_dict, subaspek_match_count, sum(mention_dict.values())))
+
+    # Nama kafe jadi tie-breaker supaya urutannya sama dengan groupby("Nama Kafe") sebelumnya
+    kafe_dengan_skor = sorted(kafe_dengan_skor, key=lambda x: (-x[2], -x[3], x[0]))
+    return kafe_dengan_skor[:top_n]
+
+def pilih_kafe_refine(total_kritik, max_kritik_awal, k=5):
+    # total_kritik urut sesuai ranking. Kafe tanpa kritik didahulukan; kalau kurang dari k,
+    # ditambah kafe dengan kritik lebih sedikit dari kafe terburuk di top 5 awal
+    lolos = np.flatnonzero(total_kritik == 0)
+    if len(lolos) < k:
+        longgar = np.flatnonzero((total_kritik > 0) & (total_kritik < max_kritik_awal))
+        lolos = np.concatenate([lolos, longgar[:k - len(lolos)]])
+    return lolos[:k]
+
+def format_kritik_str(kritik_filtered):
+    if kritik_filtered:
+        kritik_lines = "\n".join([f"- {v} menyebut **{k}**" for k, v in sorted(kritik_filtered.items(), key=lambda x: -x[1])])
+        return f"⚠️ Kritik umum ditemukan:\n{kritik_lines}"
+    else:
+        return "⚠️ Tidak ditemukan kritik umum di review."
+
+
+class VektorKata:
+    # Bagian yang hanya bergantung pada model Word2Vec (bukan data kafe): vektor query
+    # ber-cache & centroid sub-aspek. Bisa dipakai bersama oleh beberapa KafeEngine, mis.
+    # engine dari versi artefak kafe yang berbeda.
+    # word_vectors boleh berupa KeyedVectors atau fungsi tanpa argumen yang memuatnya,
+    # supaya query-based tidak ikut menunggu model Word2Vec
+    # bobot: None (rata-rata biasa), array sejajar model.key_to_index, atau fungsi (model) -> array
+    def __init__(self, word_vectors, query_cache_size=1024, bobot=None):
+        from kategori_suasana_dict_updated import kategori_suasana
+
+        self._word_vectors = word_vectors
+        self._bobot = bobot
+        self._lock = threading.Lock()
+        self._sub_aspek = None
+
+        self.sub_keywords = {
+            sub_label: keyword_list
+            for sub_dict in kategori_suasana.values()
+            for sub_label, keyword_list in sub_dict.items()
+        }
+        self.sub_labels = list(self.sub_keywords)
+
+        # Rata-rata tidak bergantung urutan keyword, tapi duplikat ikut dihitung,
+        # jadi key-nya tuple terurut (bukan frozenset) supaya hasilnya tetap sama
+        self._query_vector = lru_cache(maxsize=query_cache_size)(self._hitung_query_vector)
+
+    @property
+    def model(self):
+        if callable(self._word_vectors):
+            with self._lock:
+                if callable(self._word_vectors):
+                    self._word_vectors = self._word_vectors()
+        return self._word_vectors
+
+    @property
+    def bobot(self):
+        if callable(self._bobot):
+            model = self.model
+            with self._lock:
+                if callable(self._bobot):
+                    self._bobot = self._bobot(model)
+        return self._bobot
+
+    def _hitung_query_vector(self, keywords_key):
+        vec = make_query_vector(list(keywords_key), self.model, bobot=self.bobot)
+        vec.setflags(write=False)
+        return vec
+
+    def query_vector(self, keywords):
+        return self._query_vector(tuple(sorted(keywords)))
+
+    @property
+    def sub_aspek(self):
+        # Centroid vektor setiap sub-label kategori_suasana (label x dim), dihitung sekali
+        if self._sub_aspek is None:
+            vectors = [make_query_vector(keyword_list, self.model, bobot=self.bobot)[0] for keyword_list in self.sub_keywords.values()]
+            self._sub_aspek = {
+                "label_id": {sub_label: i for i, sub_label in enumerate(self.sub_keywords)},
+                "keywords": list(self.sub_keywords.values()),
+                "matrix": normalisasi(np.array(vectors))
+            }
+        return self._sub_aspek
+
+
+class KafeEngine:
+    # Inti rekomendasi tanpa Streamlit: semua resource yang sudah dimuat dipegang eksplisit,
+    # jadi bisa dipakai dari app, script benchmark/load test, atau worker proses lain.
+    # word_vectors: VektorKata, KeyedVectors, atau fungsi tanpa argumen yang memuat model
+    def __init__(self, kafe_token_matrix, token_index, df_kafe, kafe_search, word_vectors,
+                 query_cache_size=1024, bobot=None):
+        self.kafe_token_matrix = kafe_token_matrix
+        self.token_index = token_index
+        self.vocab = kafe_token_matrix["vocab"]
+        self.df_kafe = df_kafe
+        self.kafe_search = kafe_search
+        if not isinstance(word_vectors, VektorKata):
+            word_vectors = VektorKata(word_vectors, query_cache_size, bobot)
+        self.vektor_kata = word_vectors
+        self.sub_labels = word_vectors.sub_labels
+        self.query_vector = word_vectors.query_vector
+
+    @classmethod
+    def dari_file(cls, review_path=REVIEW_PATH, review_cache_dir=REVIEW_CACHE_DIR,
+                  kafe_vector_path=KAFE_VECTOR_PATH, model_path=MODEL_PATH,
+                  word2vec_cache_dir=WORD2VEC_CACHE_DIR, mode="exact", case_vector_dir=None):
+        # case_vector_dir: hasil case_vector_builder (mode rata/idf/sif) sebagai ganti
+        # case_vector_df.pkl; bobot token yang sama dipakai untuk vektor query
+        import pandas as pd
+        from review_cache import load_review_cache
+        from word_vectors import load_keyed_vectors
+
+        df, review_tokens, vocab = load_review_cache(review_path, review_cache_dir)
+        kafe_token_matrix = buat_kafe_token_matrix(df, review_tokens, vocab)
+        bobot = None
+        if case_vector_dir is None:
+            df_kafe = pd.read_pickle(kafe_vector_path)
+        else:
+            from case_vector_builder import load_bobot_model, load_case_vector
+            df_kafe = load_case_vector(case_vector_dir, mmap=False)
+            bobot = load_bobot_model(case_vector_dir)
+        return cls(
+            kafe_token_matrix,
+            buat_token_index(kafe_token_matrix),
+            df_kafe,
+            buat_kafe_search(df_kafe, mode),
+            lambda: load_keyed_vectors(model_path, word2vec_cache_dir),
+            bobot=bobot
+        )
+
+    @property
+    def model(self):
+        return self.vektor_kata.model
+
+    def mention(self, nama_kafe_list, kata_list):
+        return hitung_mention_kafe(self.kafe_token_matrix, nama_kafe_list, kata_list)
+
+    def skor_sub_aspek(self, preferensi_dict, kafe_vec):
+        # Similarity tiap sub-aspek ke satu kafe (vektor) atau banyak kafe (matriks kafe x dim)
+        # dalam satu perkalian matriks
+        sub_aspek = self.vektor_kata.sub_aspek
+        rows = []
+        for sub_label, keyword_list in preferensi_dict.items():
+            i = sub_aspek["label_id"].get(sub_label)
+            if i is not None and list(keyword_list) == sub_aspek["keywords"][i]:
+                rows.append(sub_aspek["matrix"][i])
+            else:
+                rows.append(normalisasi(self.query_vector(keyword_list))[0])
+
+        if not rows:
+            return np.zeros((0,) + kafe_vec.shape[:-1], dtype=np.float32)
+        return np.vstack(rows) @ kafe_vec.T
+
+    # ========================
+    # ALUR REKOMENDASI
+    # ========================
+
+    def query_based(self, preferensi_dict, top_n=10):
+        # Aplikasi 1: [(nama_kafe, mention_dict, jumlah_subaspek_cocok, total_mention)]
+        return cari_kafe_query_based(self.token_index, self.vocab, preferensi_dict, top_n)
+
+    def crs_rank(self, keywords, k=5, popularitas=None):
+        # Aplikasi 2: similarity Word2Vec (+ boost popularitas casebase, urut seperti df_kafe),
+        # top-k sebagai record df_kafe dengan kolom Similarity/Popularitas/FinalScore
+        query_vec = self.query_vector(keywords)
+        if popularitas is None or not np.any(popularitas):
+            # Tanpa sinyal popularitas ranking = similarity murni -> top-k lewat backend search (exact/LSH)
+            idx, similarity = self.kafe_search.search_idx(query_vec, k)
+            pop = np.zeros(len(idx), dtype=np.float32)
+            final_scores = similarity
+        else:
+            similarity_semua = self.kafe_search.skor_semua(query_vec)
+            final_semua = similarity_semua + BOBOT_POPULARITAS * np.asarray(popularitas, dtype=np.float32)
+            idx, final_scores = _top_k(final_semua, np.arange(len(final_semua)), min(k, len(final_semua)))
+            similarity = similarity_semua[idx]
+            pop = np.asarray(popularitas, dtype=np.float32)[idx]
+
+        records = self.df_kafe.iloc[idx].to_dict(orient="records")
+        for record, s, p, f in zip(records, similarity, pop, final_scores):
+            record["Similarity"] = float(s)
+            record["Popularitas"] = float(p)
+            record["FinalScore"] = float(f)
+        return records
+
+    def hybrid(self, preferensi_dict, k=5, popularitas=None, bobot_leksikal=BOBOT_LEKSIKAL, fusi="linear",
+               n_kandidat=N_KANDIDAT_LEKSIKAL, n_kandidat_dense=N_KANDIDAT_DENSE):
+        # Gabungan Aplikasi 1 & 2, record sama seperti crs_rank (+ kolom SkorLeksikal).
+        # Hanya kafe yang punya case vector yang bisa di-ranking
+        if fusi not in ("linear", "rrf"):
+            raise ValueError(f"Fusi tidak dikenal: {fusi} (pilih linear atau rrf)")
+        daftar_kafe, _ = self.token_index
+        row_of = self.kafe_search.row_of
+        query_vec = self.query_vector([kw for kws in preferensi_dict.values() for kw in kws])
+
+        # Skor leksikal 0..1: jumlah sub-aspek cocok, total mention (log) sebagai pembeda di bawahnya
+        mention_per_kafe, subaspek_per_kafe = skor_leksikal_kafe(self.token_index, self.vocab, preferensi_dict)
+        baris, cocok, mention = [], [], []
+        for kafe_id, n_cocok in subaspek_per_kafe.items():
+            row = row_of.get(daftar_kafe[kafe_id])
+            if row is not None:
+                baris.append(row)
+                cocok.append(n_cocok)
+                mention.append(sum(mention_per_kafe[kafe_id].values()))
+        baris = np.array(baris, dtype=np.int64)
+        mention = np.log1p(np.array(mention, dtype=np.float64))
+        skor_leksikal = (np.array(cocok, dtype=np.float64) + mention / max(mention.max(initial=0.0), 1e-9)) / (len(preferensi_dict) + 1)
+
+        # Tahap 1: kandidat = top-N leksikal + top-N dari backend search (exact/LSH)
+        kandidat = np.sort(baris[np.lexsort((baris, -skor_leksikal))[:n_kandidat]])
+        if n_kandidat_dense and np.any(query_vec):
+            idx_dense, _ = self.kafe_search.search_idx(query_vec, n_kandidat_dense)
+            kandidat = np.union1d(kandidat, idx_dense)
+        if len(kandidat) == 0:
+            return []
+        leksikal_kandidat = np.zeros(len(kandidat))
+        ada = np.isin(baris, kandidat)
+        leksikal_kandidat[np.searchsorted(kandidat, baris[ada])] = skor_leksikal[ada]
+
+        # Tahap 2: similarity hanya untuk kandidat
+        similarity = self.kafe_search.matrix[kandidat] @ normalisasi(query_vec)[0]
+        pop = np.zeros(len(kandidat)) if popularitas is None else np.asarray(popularitas, dtype=np.float64)[kandidat]
+
+        if fusi == "linear":
+            final_scores = bobot_leksikal * leksikal_kandidat + (1 - bobot_leksikal) * similarity + BOBOT_POPULARITAS * pop
+        else:
+            def rrf(skor):
+                # Skor sama -> peringkat sama, supaya urutan kandidat tidak ikut memberi bonus
+                return 1.0 / (RRF_K + 1 + np.unique(-skor, return_inverse=True)[1])
+            final_scores = bobot_leksikal * rrf(leksikal_kandidat) + (1 - bobot_leksikal) * rrf(similarity)
+            if popularitas is not None:
+                final_scores = final_scores + BOBOT_POPULARITAS * rrf(pop)
+
+        urutan = np.lexsort((kandidat, -final_scores))[:k]
+        records = self.df_kafe.iloc[kandidat[urutan]].to_dict(orient="records")
+        for record, i in zip(records, urutan):
+            record["SkorLeksikal"] = float(leksikal_kandidat[i])
+            record["Similarity"] = float(similarity[i])
+            record["Popularitas"] = float(pop[i])
+            record["FinalScore"] = float(final_scores[i])
+        return records
+
+    def refine(self, keywords, avoid, prev_top, k=5, popularitas=None):
+        # Ranking ulang dengan penalti kata yang dihindari; prev_top = nama kafe hasil sebelum
+        # refine, kritik terbanyak di antaranya jadi batas pelonggaran kalau hasil < k
+        similarity = self.kafe_search.skor_semua(self.query_vector(keywords))
+        # Total kritik semua kafe sekaligus dari satu slicing matriks (urut seperti df_kafe)
+        penalti = self.mention(self.kafe_search.names, avoid).sum(axis=1)
+        pop = np.zeros(len(similarity), dtype=np.float32) if popularitas is None else np.asarray(popularitas, dtype=np.float32)
+        final_scores = similarity - BOBOT_PENALTI * penalti + BOBOT_POPULARITAS * pop
+
+        kritik_awal = self.mention(list(prev_top), avoid).sum(axis=1)
+        max_kritik_awal = int(kritik_awal.max()) if len(kritik_awal) else 0
+
+        # ❌ Filter kafe yang mengandung kata yang ingin dihindari, ⛔ longgarkan kalau hasil < k.
+        # Yang mungkin terpilih hanya top-k tanpa kritik + top-k hasil pelonggaran, jadi cukup
+        # kandidat itu yang diurutkan (bukan seluruh kafe)
+        semua = np.arange(len(final_scores))
+        kandidat = []
+        for lolos in (penalti == 0, (penalti > 0) & (penalti < max_kritik_awal)):
+            idx = semua[lolos]
+            kandidat.append(_top_k(final_scores[idx], idx, min(k, len(idx)))[0])
+        kandidat = np.concatenate(kandidat)
+        kandidat = kandidat[np.lexsort((kandidat, -final_scores[kandidat]))]
+        pilih = kandidat[pilih_kafe_refine(penalti[kandidat], max_kritik_awal, k=k)]
+
+        records = self.df_kafe.iloc[pilih].to_dict(orient="records")
+        for record, i in zip(records, pilih):
+            record["Similarity"] = float(similarity[i])
+            record["Penalti"] = int(penalti[i])
+            record["Popularitas"] = float(pop[i])
+            record["FinalScore"] = float(final_scores[i])
+        return records
+
+    def kritik_top_kafe(self, nama_kafe_list):
+        # Total tiap kata kritik umum di semua kafe dalam list (hanya yang > 0),
+        # urutan kata sesuai kemunculan pertama per kafe
+        hasil = {}
+        for counts in self.mention(nama_kafe_list, kata_kritik_umum):
+            for k, v in zip(kata_kritik_umum, counts):
+                if v > 0:
+                    hasil[k] = hasil.get(k, 0) + int(v)
+        return hasil
+
+    def penjelasan(self, rows, keywords, preferensi_dict):
+        # Penjelasan untuk banyak kafe sekaligus: similarity sub-aspek, mention, dan kritik
+        # dihitung dalam satu pass lalu dikembalikan sebagai record biasa untuk UI
+        if not rows:
+            return []
+        nama_kafe_list = [row["Nama Kafe"] for row in rows]
+
+        kafe_search = self.kafe_search
+        kafe_vecs = kafe_search.matrix[[kafe_search.row_of[nama] for nama in nama_kafe_list]]  # sudah ter-normalisasi
+        sim_sub = self.skor_sub_aspek(preferensi_dict, kafe_vecs)  # sub-aspek x kafe
+
+        # Mention keyword + kritik umum dari satu slicing matriks
+        counts = self.mention(nama_kafe_list, [k.lower() for k in keywords] + list(kata_kritik_umum))
+        mention_counts, kritik_counts = counts[:, :len(keywords)], counts[:, len(keywords):]
+
+        hasil = []
+        for i, row in enumerate(rows):
+            # Similarity per sub-aspek (gabungan keyword dalam preferensi_dict)
+            cocok_sub = []
+            for sub_label, sim_score in zip(preferensi_dict, sim_sub[:, i]):
+                if sim_score > 0.3:  # ambang minimal relevansi
+                    cocok_sub.append((sub_label, float(sim_score)))
+
+            # Susun kalimat cocok dengan preferensi
+            if cocok_sub:
+                cocok_sub = sorted(cocok_sub, key=lambda x: -x[1])  # urutkan dari sim tertinggi
+                sub_names = [s[0] for s in cocok_sub]
+                avg_sim = np.mean([s[1] for s in cocok_sub])
+                if len(sub_names) == 1:
+                    cocok_str = sub_names[0]
+                else:
+                    cocok_str = ", ".join(sub_names[:-1]) + " dan " + sub_names[-1]
+                cocok_str += f" (sim: {avg_sim:.2f})"
+            else:
+                cocok_str = "-"
+
+            # Mention ulasan (keyword duplikat dijumlahkan, sama seperti get_keyword_mentions_per_kafe)
+            mention_dict = defaultdict(int)
+            for k, v in zip(keywords, mention_counts[i]):
+                mention_dict[k] += int(v)
+            mention_str_parts = [f"{v} menyebut '{k}'" for k, v in mention_dict.items() if v > 0]
+            mention_str = ", ".join(mention_str_parts) if mention_str_parts else "Tidak ada ulasan relevan."
+
+            # Kritik umum
+            kritik_dict = defaultdict(int)
+            for k, v in zip(kata_kritik_umum, kritik_counts[i]):
+                kritik_dict[k] += int(v)
+
+            hasil.append({
+                "nama_kafe": row["Nama Kafe"],
+                "similarity": row["Similarity"],
+                "sentiment": row.get("avg_sentiment", None),
+                "final_score": row["FinalScore"],
+                "cocok_str": cocok_str,
+                "mention_str": mention_str,
+                "kritik_str": format_kritik_str({k: v for k, v in kritik_dict.items() if v > 0})
+            })
+
+        return hasil
@@ -0,0 +1,180 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from vocabulary import LIBRARY_PATH, ReviewTokens, load_vocabulary
+
+
+# Kolom token disimpan sebagai array id + offset (bukan string list)
+TOKEN_COLS = ["tokens_negated_indo", "tokens_negated_english"]
+
+SOURCE_PATH = "data/hasil_skor_dan_aspek.xlsx"
+CACHE_DIR = "data/cache/reviews"
+
+
+def _path_cache(cache_dir, nama):
+    return os.path.join(cache_dir, nama)
+
+
+def _hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _sidik_file(path):
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": _hash_file(path)}
+
+
+def _sidik_sama(path, sidik):
+    # Cek cepat lewat mtime/size, hash hanya dihitung kalau mtime berubah
+    stat = os.stat(path)
+    if stat.st_size != sidik.get("size"):
+        return False
+    if stat.st_mtime_ns == sidik.get("mtime_ns"):
+        return True
+    if _hash_file(path) == sidik.get("sha256"):
+        sidik["mtime_ns"] = stat.st_mtime_ns
+        return True
+    return False
+
+
+def _parse_tokens(value):
+    # Ganti eval: cukup literal list Python, sel kosong jadi list kosong
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or not value.strip():
+        return []
+    return list(ast.literal_eval(value))
+
+
+def baca_review_dari_excel(source_path=SOURCE_PATH):
+    df = pd.read_excel(source_path)
+    for col in TOKEN_COLS:
+        df[col] = df[col].apply(_parse_tokens)
+    return df
+
+
+def encode_review_tokens(df, vocab):
+    # Token indo lalu english per review, sama seperti urutan penggabungan di app
+    token_lists = [[str(t) for t in indo + english] for indo, english in zip(df[TOKEN_COLS[0]], df[TOKEN_COLS[1]])]
+    n_indo = df[TOKEN_COLS[0]].map(len).to_numpy(dtype=np.int32)
+    return ReviewTokens.from_lists(token_lists, vocab, n_indo)
+
+
+def konversi_review_ke_cache(source_path=SOURCE_PATH, cache_dir=CACHE_DIR, df=None, library_path=LIBRARY_PATH):
+    if df is None:
+        df = baca_review_dari_excel(source_path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    vocab = load_vocabulary(library_path)
+    review_tokens = encode_review_tokens(df, vocab)
+
+    np.save(_path_cache(cache_dir, "token_ids.npy"), review_tokens.ids)
+    np.save(_path_cache(cache_dir, "token_offsets.npy"), review_tokens.offsets)
+    np.save(_path_cache(cache_dir, "token_n_indo.npy"), review_tokens.n_indo)
+
+    # Hanya token di luar library yang perlu disimpan, sisanya dari tokens_library.txt
+    with open(_path_cache(cache_dir, "vocab_tambahan.json"), "w", encoding="utf-8") as f:
+        json.dump(vocab.token_tambahan(), f, ensure_ascii=False)
+
+    df.drop(columns=TOKEN_COLS).to_parquet(_path_cache(cache_dir, "kolom.parquet"), index=False)
+
+    # Meta ditulis terakhir, jadi cache yang setengah jadi tidak akan dianggap valid
+    meta = {
+        "source": _sidik_file(source_path),
+        "library": _sidik_file(library_path),
+        "n_library": vocab.n_library,
+        "n_review": len(df)
+    }
+    with open(_path_cache(cache_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    return meta
+
+
+def cache_masih_valid(source_path=SOURCE_PATH, cache_dir=CACHE_DIR, library_path=LIBRARY_PATH):
+    meta_path = _path_cache(cache_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    meta_lama = json.dumps(meta, sort_keys=True)
+
+    if "library" not in meta or not _sidik_sama(library_path, meta["library"]):
+        return False
+
+    # Tanpa file sumber (mis. saat deploy), cache yang ada dipakai apa adanya
+    if os.path.exists(source_path) and not _sidik_sama(source_path, meta["source"]):
+        return False
+
+    # Simpan mtime baru kalau isi file ternyata sama (mis. file di-copy ulang)
+    if json.dumps(meta, sort_keys=True) != meta_lama:
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+    return True
+
+
+def load_review_cache(source_path=SOURCE_PATH, cache_dir=CACHE_DIR, library_path=LIBRARY_PATH, mmap=True):
+    if not cache_masih_valid(source_path, cache_dir, library_path):
+        konversi_review_ke_cache(source_path, cache_dir, library_path=library_path)
+
+    df = pd.read_parquet(_path_cache(cache_dir, "kolom.parquet"))
+
+    vocab = load_vocabulary(library_path)
+    with open(_path_cache(cache_dir, "vocab_tambahan.json"), "r", encoding="utf-8") as f:
+        for token in json.load(f):
+            vocab.tambah(token)
+
+    # Array id & offset dibuka dengan memory-map, tidak disalin ke RAM
+    mmap_mode = "r" if mmap else None
+    review_tokens = ReviewTokens(
+        np.load(_path_cache(cache_dir, "token_ids.npy"), mmap_mode=mmap_mode),
+        np.load(_path_cache(cache_dir, "token_offsets.npy"), mmap_mode=mmap_mode),
+        np.load(_path_cache(cache_dir, "token_n_indo.npy"), mmap_mode=mmap_mode)
+    )
+
+    return df, review_tokens, vocab
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Konversi review xlsx ke cache biner dan bandingkan waktu cold start.")
+    parser.add_argument("--source", default=SOURCE_PATH)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--library", default=LIBRARY_PATH)
+    args = parser.parse_args()
+
+    # Waktu dan memori (tracemalloc) untuk jalur lama vs cache biner
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    df_excel = baca_review_dari_excel(args.source)
+    t_excel = time.perf_counter() - t0
+    mem_excel = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    konversi_review_ke_cache(args.source, args.cache_dir, df=df_excel, library_path=args.library)
+    del df_excel
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    df_cache, review_tokens, vocab = load_review_cache(args.source, args.cache_dir, args.library, mmap=False)
+    t_cache = time.perf_counter() - t0
+    mem_cache = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print(f"Review             : {len(df_cache)}")
+    print(f"xlsx + parse       : {t_excel:.2f} s, {mem_excel / 2**20:.1f} MiB")
+    print(f"cache biner        : {t_cache:.2f} s, {mem_cache / 2**20:.1f} MiB (termasuk vocabulary)")
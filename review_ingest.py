@@ -0,0 +1,294 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from kafe_engine import KAFE_VECTOR_PATH, MODEL_PATH, WORD2VEC_CACHE_DIR
+from review_cache import CACHE_DIR, SOURCE_PATH, TOKEN_COLS, _parse_tokens, _sidik_file
+from versi_ingest import INGEST_DIR, baca_versi_aktif
+from vocabulary import LIBRARY_PATH, load_vocabulary
+
+
+def baca_review_stream(path, chunksize=10000):
+    # Review baru per chunk: CSV (kolom token berupa literal list) atau JSONL (list biasa)
+    if path.endswith((".jsonl", ".json")):
+        chunks = pd.read_json(path, lines=True, chunksize=chunksize)
+    else:
+        chunks = pd.read_csv(path, chunksize=chunksize)
+    for chunk in chunks:
+        for col in TOKEN_COLS:
+            chunk[col] = chunk[col].apply(_parse_tokens) if col in chunk else [[] for _ in range(len(chunk))]
+        yield chunk
+
+
+class ArtefakKafe:
+    # Agregat per kafe yang dipakai app, disimpan sebagai jumlah berjalan supaya review baru
+    # cukup ditambahkan:
+    # - counts: jumlah token per kafe (kafe x id token), sama seperti kafe_token_matrix
+    # - vector_sum / n_vektor: jumlah vektor Word2Vec token review yang ada di model;
+    #   dim_* = vector_sum / n_vektor (rata-rata vektor token)
+    # - sentimen_sum / n_sentimen: untuk avg_sentiment
+    def __init__(self, daftar_kafe, vocab, counts, vector_sum, n_vektor, sentimen_sum, n_sentimen, sumber=()):
+        self.daftar_kafe = list(daftar_kafe)
+        self.kafe_id = {nama: i for i, nama in enumerate(self.daftar_kafe)}
+        self.vocab = vocab
+        self.counts = counts.tocsr()
+        self.vector_sum = vector_sum
+        self.n_vektor = n_vektor
+        self.sentimen_sum = sentimen_sum
+        self.n_sentimen = n_sentimen
+        self.sumber = list(sumber)  # sidik file yang sudah pernah di-ingest
+
+        self._vektor_token = np.zeros((0, vector_sum.shape[1]), dtype=np.float32)
+        self._ada_di_model = np.zeros(0, dtype=np.float32)
+
+    @classmethod
+    def dari_dasar(cls, kafe_token_matrix, df_kafe, model, n_review=None):
+        # Versi awal dari artefak offline: kafe_token_matrix (review_cache) + case_vector_df.pkl.
+        # Jumlah vektor awal = rata-rata dim_* x banyak token kafe yang ada di model
+        from scipy.sparse import csr_matrix
+
+        dim_cols = [col for col in df_kafe.columns if col.startswith("dim_")]
+        daftar_kafe = list(kafe_token_matrix["daftar_kafe"]) if kafe_token_matrix else []
+        sudah_ada = set(daftar_kafe)
+        daftar_kafe += [nama for nama in df_kafe["Nama Kafe"] if nama not in sudah_ada]
+
+        vocab = kafe_token_matrix["vocab"] if kafe_token_matrix else load_vocabulary()
+        counts = csr_matrix((len(daftar_kafe), len(vocab)), dtype=np.int64)
+        if kafe_token_matrix:
+            base = kafe_token_matrix["matrix"].astype(np.int64).tocsr()
+            base.resize((len(daftar_kafe), len(vocab)))
+            counts = counts + base
+
+        artefak = cls(
+            daftar_kafe, vocab, counts,
+            np.zeros((len(daftar_kafe), len(dim_cols)), dtype=np.float64),
+            np.zeros(len(daftar_kafe), dtype=np.float64),
+            np.zeros(len(daftar_kafe), dtype=np.float64),
+            np.zeros(len(daftar_kafe), dtype=np.float64)
+        )
+
+        idx = np.array([artefak.kafe_id[nama] for nama in df_kafe["Nama Kafe"]], dtype=np.int64)
+        n_vektor = np.asarray(artefak.counts @ artefak._vektor_model(model)[1]).ravel()[idx]
+        # Kafe yang vektornya ada tapi tidak punya token di model tetap dihitung berbobot 1
+        n_vektor[n_vektor == 0] = 1
+        artefak.vector_sum[idx] = df_kafe[dim_cols].to_numpy(dtype=np.float64) * n_vektor[:, None]
+        artefak.n_vektor[idx] = n_vektor
+
+        if "avg_sentiment" in df_kafe:
+            sentimen = df_kafe["avg_sentiment"].to_numpy(dtype=np.float64)
+            n = np.ones(len(idx)) if n_review is None else np.array([n_review.get(nama, 1) for nama in df_kafe["Nama Kafe"]], dtype=np.float64)
+            ada = ~np.isnan(sentimen)
+            artefak.sentimen_sum[idx[ada]] = sentimen[ada] * n[ada]
+            artefak.n_sentimen[idx[ada]] = n[ada]
+        return artefak
+
+    @classmethod
+    def dari_versi(cls, path, library_path=LIBRARY_PATH):
+        from scipy.sparse import load_npz
+
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        vocab = _load_vocab_versi(path, library_path)
+        data = np.load(os.path.join(path, "agregat.npz"))
+        return cls(
+            meta["daftar_kafe"], vocab, load_npz(os.path.join(path, "token_counts.npz")),
+            data["vector_sum"], data["n_vektor"], data["sentimen_sum"], data["n_sentimen"],
+            sumber=meta.get("sumber", [])
+        )
+
+    def _vektor_model(self, model):
+        # Vektor per id token (0 kalau tidak ada di model); dilengkapi hanya untuk id token baru
+        n_lama = len(self._ada_di_model)
+        if len(self.vocab) > n_lama:
+            baru = self.vocab.id_to_token[n_lama:]
+            vektor = np.zeros((len(baru), self.vector_sum.shape[1]), dtype=np.float32)
+            ada = np.zeros(len(baru), dtype=np.float32)
+            for i, token in enumerate(baru):
+                if token in model:
+                    vektor[i] = model[token]
+                    ada[i] = 1.0
+            self._vektor_token = np.vstack([self._vektor_token, vektor])
+            self._ada_di_model = np.concatenate([self._ada_di_model, ada])
+        return self._vektor_token, self._ada_di_model
+
+    def _tambah_kafe(self, names):
+        baru = [nama for nama in dict.fromkeys(names) if nama not in self.kafe_id]
+        if not baru:
+            return
+        for nama in baru:
+            self.kafe_id[nama] = len(self.daftar_kafe)
+            self.daftar_kafe.append(nama)
+        n = len(self.daftar_kafe)
+        tambah = lambda arr: np.concatenate([arr, np.zeros((len(baru),) + arr.shape[1:], dtype=arr.dtype)])
+        self.vector_sum = tambah(self.vector_sum)
+        self.n_vektor = tambah(self.n_vektor)
+        self.sentimen_sum = tambah(self.sentimen_sum)
+        self.n_sentimen = tambah(self.n_sentimen)
+        self.counts.resize((n, self.counts.shape[1]))
+
+    def tambah_chunk(self, df, model, kolom_sentimen=None):
+        from scipy.sparse import csr_matrix
+
+        df = df[df["Nama Kafe"].notna()]
+        if df.empty:
+            return 0
+        self._tambah_kafe(df["Nama Kafe"])
+
+        # Token indo lalu english per review (urutan sama seperti review_cache); token di
+        # luar vocabulary diberi id baru
+        token_lists = [[str(t) for t in indo + english] for indo, english in zip(df[TOKEN_COLS[0]], df[TOKEN_COLS[1]])]
+        panjang = np.fromiter((len(t) for t in token_lists), dtype=np.int64, count=len(token_lists))
+        ids = self.vocab.encode([t for tokens in token_lists for t in tokens])
+        rows = np.repeat(np.array([self.kafe_id[nama] for nama in df["Nama Kafe"]], dtype=np.int64), panjang)
+
+        n_kafe, n_vocab = len(self.daftar_kafe), len(self.vocab)
+        chunk = csr_matrix((np.ones(len(ids), dtype=np.int64), (rows, ids)), shape=(n_kafe, n_vocab))
+        self.counts.resize((n_kafe, n_vocab))
+        self.counts = self.counts + chunk
+
+        # Jumlah vektor token per kafe = (kafe x token) @ (token x dim), satu perkalian per chunk
+        vektor_token, ada_di_model = self._vektor_model(model)
+        self.vector_sum += chunk @ vektor_token
+        self.n_vektor += chunk @ ada_di_model
+
+        if kolom_sentimen and kolom_sentimen in df:
+            sentimen = pd.to_numeric(df[kolom_sentimen], errors="coerce").to_numpy(dtype=np.float64)
+            ada = ~np.isnan(sentimen)
+            kafe_idx = np.array([self.kafe_id[nama] for nama in df["Nama Kafe"]], dtype=np.int64)[ada]
+            np.add.at(self.sentimen_sum, kafe_idx, sentimen[ada])
+            np.add.at(self.n_sentimen, kafe_idx, 1)
+        return len(df)
+
+    def df_kafe(self):
+        # Format case_vector_df.pkl: Nama Kafe, dim_*, avg_sentiment (kafe tanpa vektor dilewati)
+        ada = self.n_vektor > 0
+        vectors = (self.vector_sum[ada] / self.n_vektor[ada, None]).astype(np.float32)
+        df = pd.DataFrame(vectors, columns=[f"dim_{i}" for i in range(vectors.shape[1])])
+        df.insert(0, "Nama Kafe", [nama for nama, a in zip(self.daftar_kafe, ada) if a])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            df["avg_sentiment"] = np.where(self.n_sentimen > 0, self.sentimen_sum / self.n_sentimen, np.nan)[ada]
+        return df
+
+    def simpan(self, ingest_dir=INGEST_DIR, sumber_baru=(), simpan_versi=3):
+        from scipy.sparse import save_npz
+
+        os.makedirs(ingest_dir, exist_ok=True)
+        versi_lama = sorted(d for d in os.listdir(ingest_dir) if d.startswith("v") and d[1:].isdigit())
+        nama = f"v{int(versi_lama[-1][1:]) + 1 if versi_lama else 1:04d}"
+        path = os.path.join(ingest_dir, nama)
+        os.makedirs(path)
+
+        save_npz(os.path.join(path, "token_counts.npz"), self.counts)
+        np.savez(os.path.join(path, "agregat.npz"), vector_sum=self.vector_sum, n_vektor=self.n_vektor,
+                 sentimen_sum=self.sentimen_sum, n_sentimen=self.n_sentimen)
+        with open(os.path.join(path, "vocab_tambahan.json"), "w", encoding="utf-8") as f:
+            json.dump(self.vocab.token_tambahan(), f, ensure_ascii=False)
+        self.df_kafe().to_pickle(os.path.join(path, "case_vector_df.pkl"))
+
+        self.sumber += list(sumber_baru)
+        meta = {
+            "versi": nama,
+            "induk": os.path.basename(baca_versi_aktif(ingest_dir) or "") or None,
+            "dibuat": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "n_library": self.vocab.n_library,
+            "daftar_kafe": self.daftar_kafe,
+            "sumber": self.sumber
+        }
+        # Meta ditulis terakhir, lalu CURRENT diganti atomik -> app tidak pernah melihat versi setengah jadi
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        tmp = os.path.join(ingest_dir, "CURRENT.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(nama)
+        os.replace(tmp, os.path.join(ingest_dir, "CURRENT"))
+
+        # Versi lama dibuang, sisakan beberapa (proses app bisa saja masih memakai versi sebelumnya)
+        for lama in versi_lama[:max(len(versi_lama) + 1 - simpan_versi, 0)]:
+            shutil.rmtree(os.path.join(ingest_dir, lama), ignore_errors=True)
+        return path
+
+
+def _load_vocab_versi(path, library_path=LIBRARY_PATH):
+    vocab = load_vocabulary(library_path)
+    with open(os.path.join(path, "vocab_tambahan.json"), "r", encoding="utf-8") as f:
+        for token in json.load(f):
+            vocab.tambah(token)
+    return vocab
+
+
+def load_kafe_token_matrix_versi(path, library_path=LIBRARY_PATH):
+    # Sama dengan buat_kafe_token_matrix(), dari token_counts versi ingest
+    from scipy.sparse import load_npz
+
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        daftar_kafe = json.load(f)["daftar_kafe"]
+    return {
+        "daftar_kafe": daftar_kafe,
+        "kafe_id": {nama: i for i, nama in enumerate(daftar_kafe)},
+        "vocab": _load_vocab_versi(path, library_path),
+        "matrix": load_npz(os.path.join(path, "token_counts.npz")).tocsr()
+    }
+
+
+def load_kafe_vector_versi(path):
+    return pd.read_pickle(os.path.join(path, "case_vector_df.pkl"))
+
+
+def _artefak_dasar(model, source_path=SOURCE_PATH, cache_dir=CACHE_DIR, kafe_vector_path=KAFE_VECTOR_PATH):
+    # Titik awal ingest pertama: cache review (kalau xlsx/cache-nya ada) + case_vector_df.pkl
+    from kafe_engine import buat_kafe_token_matrix
+    from review_cache import cache_masih_valid, load_review_cache
+
+    kafe_token_matrix, n_review = None, None
+    if os.path.exists(source_path) or cache_masih_valid(source_path, cache_dir):
+        df, review_tokens, vocab = load_review_cache(source_path, cache_dir)
+        kafe_token_matrix = buat_kafe_token_matrix(df, review_tokens, vocab)
+        n_review = df["Nama Kafe"].value_counts().to_dict()
+    return ArtefakKafe.dari_dasar(kafe_token_matrix, pd.read_pickle(kafe_vector_path), model, n_review)
+
+
+if __name__ == "__main__":
+    from word_vectors import load_keyed_vectors
+
+    parser = argparse.ArgumentParser(description="Ingest review baru (CSV/JSONL) ke artefak per kafe berversi.")
+    parser.add_argument("paths", nargs="+", help="file review baru: kolom Nama Kafe + tokens_negated_indo/english")
+    parser.add_argument("--ingest-dir", default=INGEST_DIR)
+    parser.add_argument("--chunksize", type=int, default=10000)
+    parser.add_argument("--kolom-sentimen", default=None, help="kolom skor sentimen per review (opsional)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--word2vec-cache-dir", default=WORD2VEC_CACHE_DIR)
+    parser.add_argument("--simpan-versi", type=int, default=3)
+    parser.add_argument("--paksa", action="store_true", help="ingest ulang file yang sudah pernah masuk")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    model = load_keyed_vectors(args.model, args.word2vec_cache_dir)
+    versi = baca_versi_aktif(args.ingest_dir)
+    artefak = ArtefakKafe.dari_versi(versi) if versi else _artefak_dasar(model)
+    print(f"Mulai dari        : {versi or 'artefak offline (review cache + case_vector_df.pkl)'}, "
+          f"{len(artefak.daftar_kafe)} kafe ({time.perf_counter() - t0:.1f} s)")
+
+    sha_lama = {s["sha256"] for s in artefak.sumber}
+    sumber_baru, n_total = [], 0
+    for path in args.paths:
+        sidik = _sidik_file(path)
+        if sidik["sha256"] in sha_lama and not args.paksa:
+            print(f"Lewati            : {path} (sudah pernah di-ingest)")
+            continue
+        t0 = time.perf_counter()
+        n_file = sum(artefak.tambah_chunk(chunk, model, args.kolom_sentimen) for chunk in baca_review_stream(path, args.chunksize))
+        sidik["n_review"] = n_file
+        sumber_baru.append(sidik)
+        n_total += n_file
+        print(f"Ingest            : {path}, {n_file} review ({time.perf_counter() - t0:.1f} s)")
+
+    if not sumber_baru:
+        print("Tidak ada review baru, versi aktif tidak berubah.")
+    else:
+        path = artefak.simpan(args.ingest_dir, sumber_baru, args.simpan_versi)
+        print(f"Versi baru        : {path} ({n_total} review, {len(artefak.daftar_kafe)} kafe)")
@@ -0,0 +1,288 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+OUTBOX_PATH = "data/outbox/sheet_outbox.sqlite3"
+# Nama kolom header tempat row_id ditulis; pembaca casebase mengabaikan kolom ini
+KOLOM_ROW_ID = "row_id"
+
+
+class SheetOutbox:
+    # Antrian baris yang akan di-append ke Google Sheets, disimpan di SQLite lokal.
+    # Handler cukup tambah() (satu INSERT), worker di background yang mengirim per batch
+    # dengan retry + backoff. Setiap baris membawa row_id (UUID) di kolom berheader "row_id", jadi
+    # kiriman yang hasilnya tidak pasti (timeout, proses mati setelah append) dicek dulu
+    # ke sheet sebelum dikirim ulang -> tiap baris masuk sheet tepat satu kali
+    def __init__(self, path, get_worksheet, setelah_kirim=None, batch_size=50, interval=2.0,
+                 backoff_awal=2.0, backoff_maks=300.0, lease=120.0):
+        self.path = path
+        self.get_worksheet = get_worksheet  # (spreadsheet_id, sheet_name) -> worksheet
+        self.setelah_kirim = setelah_kirim  # dipanggil (spreadsheet_id, sheet_name) setelah batch masuk
+        self.batch_size = batch_size
+        self.interval = interval
+        self.backoff_awal = backoff_awal
+        self.backoff_maks = backoff_maks
+        self.lease = lease
+
+        self._lock = threading.Lock()
+        self._ada_baru = threading.Event()
+        self._worker = None
+        self._backoff = {}  # (spreadsheet_id, sheet_name) -> (jumlah gagal beruntun, coba lagi pada)
+        self._kolom = {}  # (spreadsheet_id, sheet_name) -> nomor kolom row_id
+        self.error_terakhir = None
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # WAL: pembaca & penulis (termasuk proses lain) tidak saling menunggu lama
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                row_id TEXT NOT NULL UNIQUE,
+                spreadsheet_id TEXT NOT NULL,
+                sheet_name TEXT NOT NULL,
+                nilai TEXT NOT NULL,
+                dibuat REAL NOT NULL,
+                percobaan INTEGER NOT NULL DEFAULT 0,
+                kunci_sampai REAL NOT NULL DEFAULT 0,
+                error TEXT
+            )
+        """)
+
+    def _transaksi(self, fn):
+        # BEGIN IMMEDIATE: klaim baris tidak bentrok dengan worker di proses lain
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                hasil = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return hasil
+
+    def tambah(self, spreadsheet_id, sheet_name, values):
+        # Tersimpan di disk begitu fungsi ini kembali; pengiriman ke sheet menyusul
+        row_id = uuid.uuid4().hex
+        nilai = json.dumps([str(v) for v in values], ensure_ascii=False)
+        self._transaksi(lambda conn: conn.execute(
+            "INSERT INTO outbox (row_id, spreadsheet_id, sheet_name, nilai, dibuat) VALUES (?, ?, ?, ?, ?)",
+            (row_id, spreadsheet_id, sheet_name, nilai, time.time())
+        ))
+        self._ada_baru.set()
+        return row_id
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def status(self):
+        # Jumlah baris tertunda per sheet + error terakhir, untuk ditampilkan/diawasi
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT spreadsheet_id, sheet_name, COUNT(*), MAX(percobaan), MIN(dibuat) "
+                "FROM outbox GROUP BY spreadsheet_id, sheet_name"
+            ).fetchall()
+        return [
+            {"spreadsheet_id": s, "sheet_name": n, "tertunda": c, "percobaan_maks": p, "tertua": t}
+            for s, n, c, p, t in rows
+        ]
+
+    def _klaim(self, spreadsheet_id, sheet_name):
+        # Ambil satu batch yang tidak sedang dikirim worker lain dan kunci selama lease
+        def klaim(conn):
+            sekarang = time.time()
+            rows = conn.execute(
+                "SELECT seq, row_id, nilai, percobaan FROM outbox "
+                "WHERE spreadsheet_id = ? AND sheet_name = ? AND kunci_sampai < ? ORDER BY seq LIMIT ?",
+                (spreadsheet_id, sheet_name, sekarang, self.batch_size)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET percobaan = percobaan + 1, kunci_sampai = ? WHERE seq = ?",
+                [(sekarang + self.lease, seq) for seq, *_ in rows]
+            )
+            return rows
+        return self._transaksi(klaim)
+
+    def _kolom_row_id(self, wks, target, lebar):
+        # Nomor kolom (1-based) berheader "row_id". Kalau belum ada, header ditambah kolom itu
+        # di kanan header yang ada
+        if target not in self._kolom:
+            header = wks.get_row(1, include_tailing_empty=False)
+            # Baris 1 harus header: tidak kosong, nama kolom terisi & unik. Kalau bukan, tidak ada
+            # yang ditulis (sel data tidak tertimpa); error tercatat dan baris tetap di antrian
+            if not header or "" in header or len(set(header)) < len(header):
+                raise ValueError(f"baris 1 di {target[1]} bukan header (kosong atau nama kolom kosong/ganda)")
+            if KOLOM_ROW_ID in header:
+                self._kolom[target] = header.index(KOLOM_ROW_ID) + 1
+            elif lebar > len(header):
+                raise ValueError(f"baris lebih lebar dari header {target[1]} ({lebar} > {len(header)} kolom)")
+            else:
+                kolom = len(header) + 1
+                # Grid sheet berukuran tetap: kolom baru harus ditambahkan dulu sebelum ditulis
+                if kolom > wks.cols:
+                    wks.add_cols(kolom - wks.cols)
+                wks.update_value((1, kolom), KOLOM_ROW_ID)
+                self._kolom[target] = kolom
+        return self._kolom[target]
+
+    def _sudah_di_sheet(self, wks, kolom):
+        # row_id yang sudah ada di sheet, dibaca dari kolom row_id
+        wks.refresh()
+        if wks.rows < 2:
+            return set()
+        values = wks.get_values(start=(2, kolom), end=(wks.rows, kolom), include_tailing_empty_rows=False)
+        return {v[0] for v in values if v}
+
+    def _kirim_batch(self, spreadsheet_id, sheet_name):
+        rows = self._klaim(spreadsheet_id, sheet_name)
+        if not rows:
+            return 0
+
+        target = (spreadsheet_id, sheet_name)
+        batch = [(seq, row_id, json.loads(nilai)) for seq, row_id, nilai, _ in rows]
+        try:
+            wks = self.get_worksheet(spreadsheet_id, sheet_name)
+            kolom = self._kolom_row_id(wks, target, max(len(values) for *_, values in batch))
+            if any(len(values) >= kolom for *_, values in batch):
+                raise ValueError(f"baris lebih lebar dari kolom {KOLOM_ROW_ID} (kolom {kolom}) di {sheet_name}")
+            batch = [(seq, row_id, values + [""] * (kolom - 1 - len(values)) + [row_id]) for seq, row_id, values in batch]
+
+            # Pernah diklaim sebelumnya -> mungkin sudah masuk sheet, jangan dikirim dobel
+            if any(percobaan > 0 for *_, percobaan in rows):
+                ada = self._sudah_di_sheet(wks, kolom)
+                dikirim = [values for _, row_id, values in batch if row_id not in ada]
+            else:
+                dikirim = [values for *_, values in batch]
+            if dikirim:
+                wks.append_table(dikirim, dimension="ROWS")
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            self._kolom.pop(target, None)  # header bisa saja diubah orang, dibaca ulang saat coba lagi
+            # Lepas kunci supaya bisa dicoba lagi setelah backoff (percobaan tetap tercatat)
+            self._transaksi(lambda conn: conn.executemany(
+                "UPDATE outbox SET kunci_sampai = 0, error = ? WHERE seq = ?", [(error, seq) for seq, *_ in batch]
+            ))
+            raise
+
+        self._transaksi(lambda conn: conn.executemany("DELETE FROM outbox WHERE seq = ?", [(seq,) for seq, *_ in batch]))
+        return len(batch)
+
+    def flush(self, abaikan_backoff=False):
+        # Kirim semua yang tertunda (per sheet, per batch). Sheet yang gagal dilewati sampai
+        # backoff-nya habis; -> jumlah baris yang berhasil dikirim
+        try:
+            with self._lock:
+                targets = self._conn.execute("SELECT DISTINCT spreadsheet_id, sheet_name FROM outbox").fetchall()
+        except Exception as e:
+            # Mis. database terkunci lama oleh proses lain: dicoba lagi di putaran berikutnya
+            self.error_terakhir = e
+            return 0
+
+        terkirim = 0
+        for target in targets:
+            gagal, coba_lagi = self._backoff.get(target, (0, 0.0))
+            if not abaikan_backoff and time.time() < coba_lagi:
+                continue
+            try:
+                n_target = 0
+                while True:
+                    n = self._kirim_batch(*target)
+                    if n == 0:
+                        break
+                    n_target += n
+                self._backoff.pop(target, None)
+            except Exception as e:
+                self.error_terakhir = e
+                tunda = min(self.backoff_awal * 2 ** gagal, self.backoff_maks)
+                self._backoff[target] = (gagal + 1, time.time() + tunda)
+            terkirim += n_target
+            if n_target and self.setelah_kirim is not None:
+                try:
+                    self.setelah_kirim(*target)
+                except Exception as e:
+                    self.error_terakhir = e
+        return terkirim
+
+    def _jalan(self):
+        # Error apa pun dicatat di error_terakhir; worker tidak boleh mati karena satu putaran gagal
+        while True:
+            try:
+                self._ada_baru.wait(self.interval)
+                self._ada_baru.clear()
+                self.flush()
+            except Exception as e:
+                self.error_terakhir = e
+
+    def mulai_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._jalan, daemon=True, name="sheet-outbox")
+            self._worker.start()
+        return self._worker
+
+
+class _WorksheetTidakStabil:
+    # Worksheet tiruan untuk simulasi: append kadang gagal sebelum menulis, kadang
+    # berhasil menulis tapi tetap melempar error (respons hilang di jalan)
+    def __init__(self, wks, rng, p_gagal, p_respons_hilang, latensi):
+        self.wks = wks
+        self.rng = rng
+        self.p_gagal = p_gagal
+        self.p_respons_hilang = p_respons_hilang
+        self.latensi = latensi
+
+    def __getattr__(self, nama):
+        return getattr(self.wks, nama)
+
+    def append_table(self, values, **kwargs):
+        time.sleep(self.latensi)
+        if self.rng.random() < self.p_gagal:
+            raise ConnectionError("simulasi: gagal sebelum menulis")
+        self.wks.append_table(values, **kwargs)
+        if self.rng.random() < self.p_respons_hilang:
+            raise TimeoutError("simulasi: respons hilang setelah menulis")
+
+
+if __name__ == "__main__":
+    import random
+    import tempfile
+
+    from casebase_repo import LocalWorksheet
+
+    parser = argparse.ArgumentParser(description="Simulasi outbox ke worksheet lokal yang tidak stabil (cek exactly-once).")
+    parser.add_argument("--n-baris", type=int, default=500)
+    parser.add_argument("--p-gagal", type=float, default=0.2)
+    parser.add_argument("--p-respons-hilang", type=float, default=0.2)
+    parser.add_argument("--latensi", type=float, default=0.3, help="detik per append (round trip Sheets)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wks = _WorksheetTidakStabil(
+            LocalWorksheet(os.path.join(tmp, "sheet.json"), header=["a", "b", "c"]),
+            random.Random(args.seed), args.p_gagal, args.p_respons_hilang, args.latensi
+        )
+        outbox = SheetOutbox(os.path.join(tmp, "outbox.sqlite3"), lambda s, n: wks, backoff_awal=0.0)
+
+        t0 = time.perf_counter()
+        row_ids = [outbox.tambah("sim", "Sheet1", [i, f"x{i}", "y"]) for i in range(args.n_baris)]
+        t_tambah = (time.perf_counter() - t0) / args.n_baris
+
+        t0 = time.perf_counter()
+        n_flush = 0
+        while len(outbox):
+            outbox.flush()
+            n_flush += 1
+        t_flush = time.perf_counter() - t0
+
+        header, *isi = wks.wks._baca()
+        isi = [row[header.index(KOLOM_ROW_ID)] for row in isi]
+        print(f"tambah() per baris : {1000 * t_tambah:.2f} ms (append langsung: {1000 * args.latensi:.0f} ms + risiko data hilang)")
+        print(f"flush              : {t_flush:.2f} s, {n_flush} putaran")
+        print(f"baris di sheet     : {len(isi)} dari {args.n_baris}, unik {len(set(isi))}, "
+              f"exactly-once: {sorted(isi) == sorted(row_ids)}")
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+def normalisasi(vectors):
+    # L2-normalisasi per baris; vektor nol tetap nol (cosine = 0, sama seperti sklearn)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norm = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norm[norm == 0] = 1.0
+    return np.ascontiguousarray(vectors / norm)
+
+
+def _top_k(scores, idx, k):
+    # argpartition O(n), lalu hanya k kandidat yang diurutkan (skor turun, index naik)
+    if k < len(scores):
+        pilih = np.argpartition(-scores, k - 1)[:k]
+        scores, idx = scores[pilih], idx[pilih]
+    urutan = np.lexsort((idx, -scores))
+    return idx[urutan], scores[urutan]
+
+
+class ExactSearch:
+    # Pencarian cosine eksak: satu dot product ke matriks yang sudah dinormalisasi
+    def __init__(self, names, vectors):
+        self.names = list(names)
+        self.row_of = {nama: i for i, nama in enumerate(self.names)}
+        self.matrix = normalisasi(vectors)
+
+    def __len__(self):
+        return len(self.names)
+
+    def skor_semua(self, query_vec):
+        return self.matrix @ normalisasi(query_vec)[0]
+
+    def skor_kafe(self, query_vec, nama_kafe):
+        return float(self.matrix[self.row_of[nama_kafe]] @ normalisasi(query_vec)[0])
+
+    def search_idx(self, query_vec, k=5):
+        scores = self.skor_semua(query_vec)
+        return _top_k(scores, np.arange(len(scores)), min(k, len(scores)))
+
+    def search(self, query_vec, k=5):
+        idx, scores = self.search_idx(query_vec, k)
+        return [(self.names[i], float(s)) for i, s in zip(idx, scores)]
+
+
+class LSHSearch(ExactSearch):
+    # Aproksimasi dengan random-projection LSH: kandidat dari bucket yang sama
+    # di beberapa tabel, lalu di-rerank secara eksak
+    def __init__(self, names, vectors, n_bits=12, n_tabel=8, seed=42):
+        super().__init__(names, vectors)
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((n_tabel, self.matrix.shape[1], n_bits)).astype(np.float32)
+        self.bobot_bit = (1 << np.arange(n_bits)).astype(np.int64)
+
+        self.tabel = []
+        for kode in self._kode(self.matrix):
+            urutan = np.argsort(kode, kind="stable")
+            kode_urut = kode[urutan]
+            awal = np.flatnonzero(np.r_[True, kode_urut[1:] != kode_urut[:-1]])
+            akhir = np.r_[awal[1:], len(kode_urut)]
+            self.tabel.append({int(kode_urut[a]): urutan[a:b] for a, b in zip(awal, akhir)})
+
+    def _kode(self, vectors):
+        # Satu kode bucket (bit tanda proyeksi) per tabel per vektor
+        return [((vectors @ planes) > 0) @ self.bobot_bit for planes in self.planes]
+
+    def search_idx(self, query_vec, k=5):
+        query = normalisasi(query_vec)
+        kandidat = [
+            tabel.get(int(kode[0]), np.empty(0, dtype=np.int64))
+            for tabel, kode in zip(self.tabel, self._kode(query))
+        ]
+        kandidat = np.unique(np.concatenate(kandidat))
+
+        # Kandidat terlalu sedikit -> jatuh ke pencarian eksak
+        if len(kandidat) < k:
+            return super().search_idx(query_vec, k)
+
+        scores = self.matrix[kandidat] @ query[0]
+        return _top_k(scores, kandidat, k)
+
+
+SEARCH_BACKENDS = {
+    "exact": ExactSearch,
+    "lsh": LSHSearch
+}
+
+
+def buat_search_backend(names, vectors, mode="exact", **kwargs):
+    if mode not in SEARCH_BACKENDS:
+        raise ValueError(f"Mode pencarian tidak dikenal: {mode} (pilihan: {', '.join(SEARCH_BACKENDS)})")
+    return SEARCH_BACKENDS[mode](names, vectors, **kwargs)
@@ -3,45 +3,225 @@ if "next_step" in st.session_state:
     st.session_state.step = st.session_state.next_step
     del st.session_state.next_step
 
-import pandas as pd
 import numpy as np
 import os
 import json
-from gensim.models import Word2Vec
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
 from collections import defaultdict
-import pygsheets
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
+from similarity_search import normalisasi
+from casebase_repo import CasebaseRepository, LocalWorksheet, PopularityTable
+from case_retrieval import CaseRetrieval
+from sheet_outbox import SheetOutbox
+from versi_ingest import baca_versi_aktif
+from kafe_engine import (
+    KafeEngine, VektorKata, buat_kafe_search, buat_kafe_token_matrix, buat_token_index, format_kritik_str,
+    hitung_mention_kafe, kata_kritik_umum
+)
 
 
 # Routing antar halaman
 st.set_page_config(page_title="Sistem Rekomendasi Kafe", layout="centered")
 
 # Path data
-@st.cache_data
+@st.cache_resource
 def load_review_data():
-    df = pd.read_excel("data/hasil_skor_dan_aspek.xlsx")
-    df["tokens_negated_indo"] = df["tokens_negated_indo"].apply(eval)
-    df["tokens_negated_english"] = df["tokens_negated_english"].apply(eval)
-    return df
-
-@st.cache_data
-def load_kafe_vector():
+    # Baca dari cache biner di data/cache/, dibangun ulang hanya jika xlsx berubah.
+    # Token review berupa id int32 (format CSR) dengan vocabulary dari tokens_library.txt
+    from review_cache import load_review_cache
+    return load_review_cache("data/hasil_skor_dan_aspek.xlsx", "data/cache/reviews")
+
+# Resource data kafe di bawah ini di-cache per versi artefak: versi None = artefak offline
+# (review xlsx + case_vector_df.pkl), selain itu folder versi hasil review_ingest.py.
+# Maksimal 2 versi (aktif + sebelumnya) yang disimpan di cache
+
+# Matriks sparse jumlah token per kafe (kafe x id token), dibangun sekali dari review
+@st.cache_resource(max_entries=2)
+def load_kafe_token_matrix(versi=None):
+    if versi is not None:
+        from review_ingest import load_kafe_token_matrix_versi
+        return load_kafe_token_matrix_versi(versi)
+    return buat_kafe_token_matrix(*load_review_data())
+
+# Inverted index id token -> {kafe_id: jumlah}, diambil dari kolom matriks di atas
+@st.cache_resource(max_entries=2)
+def load_token_index(versi=None):
+    return buat_token_index(load_kafe_token_matrix(versi))
+
+@st.cache_data(max_entries=2)
+def load_kafe_vector(versi=None):
+    import pandas as pd
+    if versi is not None:
+        from review_ingest import load_kafe_vector_versi
+        return load_kafe_vector_versi(versi)
     return pd.read_pickle("data/case_vector_df.pkl")
 
+# Matriks case (dim_*) float32 ter-normalisasi + map nama kafe -> baris, sekali per proses
+@st.cache_resource(max_entries=2)
+def load_kafe_search(mode="exact", versi=None):
+    return buat_kafe_search(load_kafe_vector(versi), mode)
+
+# Hanya KeyedVectors (model.wv) yang di-mmap dari data/cache/, baru dimuat saat step CRS
+# pertama kali membutuhkannya
 @st.cache_resource
 def load_word2vec_model():
-    return Word2Vec.load("data/word2vec_model.model")
+    from word_vectors import load_keyed_vectors
+    return load_keyed_vectors("data/word2vec_model.model", "data/cache/word2vec")
 
-# Panggil di awal
-df_review = load_review_data()
-df_kafe = load_kafe_vector()
-model_w2v = load_word2vec_model()
+# Vektor query ber-cache & centroid sub-aspek (hanya bergantung pada model Word2Vec),
+# dipakai bersama oleh engine semua versi artefak. Model diberikan sebagai loader,
+# jadi baru dimuat saat langkah CRS pertama kali memakainya
+@st.cache_resource
+def load_vektor_kata():
+    return VektorKata(load_word2vec_model)
+
+# Engine rekomendasi (kafe_engine) di atas resource yang sudah di-cache
+@st.cache_resource(max_entries=2)
+def load_engine(mode="exact", versi=None):
+    return KafeEngine(
+        load_kafe_token_matrix(versi),
+        load_token_index(versi),
+        load_kafe_vector(versi),
+        load_kafe_search(mode, versi),
+        load_vektor_kata()
+    )
 
+# ========================
+# VERSI ARTEFAK KAFE (hot-swap hasil review_ingest.py)
+# ========================
 
-# Ambil kolom vektor Word2Vec
-vector_cols = [col for col in df_kafe.columns if col.startswith("dim_")]
-X_matrix = df_kafe[vector_cols].values
+@st.cache_resource
+def load_status_artefak():
+    return {"aktif": baca_versi_aktif(), "gagal": None, "thread": None}
+
+def versi_artefak_aktif():
+    # Versi baru dipanaskan dulu di background; selama itu (atau kalau gagal dimuat)
+    # rerun tetap memakai versi lama, jadi user tidak pernah menunggu pergantian versi
+    status = load_status_artefak()
+    terbaru = baca_versi_aktif()
+    thread = status["thread"]
+    if terbaru not in (status["aktif"], status["gagal"]) and (thread is None or not thread.is_alive()):
+        status["thread"] = threading.Thread(target=panaskan_versi_artefak, args=(status, terbaru), daemon=True)
+        status["thread"].start()
+    return status["aktif"]
+
+def panaskan_versi_artefak(status, versi):
+    try:
+        load_engine(os.environ.get("KAFE_SEARCH_MODE", "exact"), versi)
+    except Exception:
+        status["gagal"] = versi
+        return
+    status["aktif"] = versi
+
+# ========================
+# RESOURCE PER STEP
+# ========================
+
+CASEBASE_SPREADSHEET_ID = "1RlsZ4h9FLSX_2J5wNuDn_fBQcVhSAnLe3A7eXqoB9HI"
+
+# Data & model berat baru dimuat saat step yang membutuhkannya pertama kali dirender,
+# jadi halaman intro/identitas/survey tidak menunggu semuanya.
+# nama resource -> (nama field di dict hasil muat_resource, loader(versi artefak))
+RESOURCE_LOADERS = {
+    "review": (("df_review", "review_tokens", "vocab"), lambda versi: load_review_data()),
+    "kafe_token_matrix": (("kafe_token_matrix",), lambda versi: load_kafe_token_matrix(versi)),
+    "token_index": (("token_index",), lambda versi: load_token_index(versi)),
+    "kafe_vector": (("df_kafe",), lambda versi: load_kafe_vector(versi)),
+    # Backend pencarian similarity: "exact" (default) atau "lsh" untuk casebase besar
+    "kafe_search": (("kafe_search",), lambda versi: load_kafe_search(os.environ.get("KAFE_SEARCH_MODE", "exact"), versi)),
+    "word2vec": ((), lambda versi: load_word2vec_model()),
+    "engine": (("engine",), lambda versi: load_engine(os.environ.get("KAFE_SEARCH_MODE", "exact"), versi)),
+    "casebase": ((), lambda versi: load_casebase_repo(CASEBASE_SPREADSHEET_ID, "Sheet2").semua_case()),
+    "sheets_client": ((), lambda versi: load_sheets_client()),
+    "sheet_outbox": ((), lambda versi: load_sheet_outbox())
+}
+
+CRS_RESOURCES = ["review", "kafe_token_matrix", "kafe_vector", "kafe_search", "word2vec", "engine", "casebase"]
+
+STEP_RESOURCES = {
+    "query_based": ["review", "token_index", "engine"],
+    "crs_cbr": CRS_RESOURCES,
+    "crs_refine": CRS_RESOURCES,
+    "crs_compare": CRS_RESOURCES
+}
+
+def muat_resource(nama_list, versi=None):
+    # -> dict resource untuk step ini, diteruskan ke fungsi step. Bukan lewat globals():
+    # modul app dipakai bersama oleh semua sesi, sedangkan versi artefak bisa beda per rerun.
+    # versi dibaca sekali per rerun (controller), supaya semua resource satu versi
+    res = {"versi_artefak": versi}
+    for nama in nama_list:
+        nama_field, loader = RESOURCE_LOADERS[nama]
+        hasil = loader(versi)
+        if len(nama_field) == 1:
+            hasil = (hasil,)
+        res.update(zip(nama_field, hasil))
+    return res
+
+def panaskan_resource(nama_list=None, versi=None):
+    # Dipanggil di thread background: cukup isi cache st.cache_resource/cache_data (urut sesuai
+    # alur step), dict resource tetap dibuat oleh muat_resource() di thread script.
+    # Tanpa nama_list semua resource dipanaskan, termasuk client sheets (step survey/pamit
+    # memuatnya saat submit) dan outbox, yang worker-nya langsung mengirim sisa antrian
+    # dari proses sebelumnya
+    for nama in nama_list or RESOURCE_LOADERS:
+        try:
+            RESOURCE_LOADERS[nama][1](versi)
+        except Exception:
+            pass  # gagal di background -> dicoba lagi (dengan error yang terlihat) saat step-nya dibuka
+
+# Satu thread pemanasan per proses, dimulai setelah halaman intro tampil.
+# Sengaja tanpa ScriptRunContext supaya spinner cache tidak muncul di halaman intro
+@st.cache_resource
+def mulai_panaskan_resource():
+    thread = threading.Thread(target=panaskan_resource, args=(None, load_status_artefak()["aktif"]), daemon=True)
+    thread.start()
+    return thread
+
+# ========================
+# PREFETCH STEP BERIKUTNYA (per sesi)
+# ========================
+
+# Alur step tetap, jadi selagi user membaca satu halaman, kebutuhan halaman berikutnya
+# sudah bisa disiapkan
+STEP_BERIKUTNYA = {
+    "intro": "identity",
+    "identity": "intro_query",
+    "intro_query": "query_based",
+    "query_based": "intro_crs",
+    "intro_crs": "crs_cbr",
+    "crs_cbr": "crs_refine",
+    "crs_refine": "crs_compare"
+}
+
+def prefetch(key, fn, *args):
+    # Jalankan fn(*args) sekali per key di thread pool milik sesi ini; fn tidak boleh
+    # menyentuh st.session_state, hasilnya diserahkan lewat Future di session state
+    if "prefetch_executor" not in st.session_state:
+        st.session_state.prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        st.session_state.prefetch = {}
+    if key not in st.session_state.prefetch:
+        st.session_state.prefetch[key] = st.session_state.prefetch_executor.submit(fn, *args)
+    return st.session_state.prefetch[key]
+
+def ambil_prefetch(key, fn, *args):
+    # Hasil prefetch kalau ada (tunggu kalau masih jalan), kalau tidak/gagal hitung langsung
+    future = st.session_state.get("prefetch", {}).get(key)
+    if future is not None:
+        try:
+            return future.result()
+        except Exception:
+            del st.session_state.prefetch[key]
+    return fn(*args)
+
+def prefetch_step_berikutnya(step, versi=None):
+    step_berikutnya = STEP_BERIKUTNYA.get(step)
+    if step_berikutnya in STEP_RESOURCES:
+        prefetch(("resource", step_berikutnya, versi), panaskan_resource, STEP_RESOURCES[step_berikutnya], versi)
+    if step_berikutnya == "crs_cbr":
+        # Casebase terbaru untuk cek "pernah dicari user lain" & case termirip
+        prefetch(("casebase_sync",), load_casebase_repo(CASEBASE_SPREADSHEET_ID, "Sheet2").sync)
 
 # file_json_handler = "kodeRahasia_jangandiShare.json"
 
@@ -56,9 +236,67 @@ def buat_file_credential_sementara():
         return tmp.name  # Kembalikan path-nya
 
 
-cred_path = buat_file_credential_sementara()  # Buat file sementara
+# Satu client pygsheets per proses, baru otentikasi saat pertama kali dipakai.
+# Token disimpan di client dan di-refresh sendiri oleh pygsheets
+@st.cache_resource
+def load_sheets_client():
+    import pygsheets
+
+    if "gcp_service_account" in st.secrets:
+        cred_path = buat_file_credential_sementara()  # Buat file sementara
+        try:
+            return pygsheets.authorize(service_file=cred_path)  # Otentikasi
+        finally:
+            os.remove(cred_path)  # Kredensial sudah di memori, file tidak perlu disimpan
+
+    # 🧪 Untuk local dev, pakai file langsung
+    return pygsheets.authorize(service_file="client_secret.json")
+
+@st.cache_resource
+def load_worksheet(spreadsheet_id, sheet_name):
+    # 🧪 KAFE_LOCAL_SHEET_DIR: pakai sheet tiruan berbasis file lokal (tanpa Google Sheets)
+    local_dir = os.environ.get("KAFE_LOCAL_SHEET_DIR")
+    if local_dir:
+        return LocalWorksheet(os.path.join(local_dir, f"{spreadsheet_id}_{sheet_name}.json"))
+
+    sh = load_sheets_client().open_by_key(spreadsheet_id)
+    return sh.worksheet_by_title(sheet_name)
 
-gc = pygsheets.authorize(service_file=cred_path)  # Otentikasi
+# Salinan lokal casebase di data/cache/, disinkronkan bertahap dari sheet (TTL 5 menit)
+@st.cache_resource
+def load_casebase_repo(spreadsheet_id, sheet_name):
+    return CasebaseRepository(
+        lambda: load_worksheet(spreadsheet_id, sheet_name),
+        local_path=f"data/cache/casebase_{spreadsheet_id}_{sheet_name}.jsonl",
+        ttl=300
+    )
+
+# Antrian tulis ke sheet (SQLite di data/outbox/): handler tombol simpan hanya menulis ke
+# disk, worker background yang meng-append ke Google Sheets per batch dengan retry
+@st.cache_resource
+def load_sheet_outbox():
+    outbox = SheetOutbox("data/outbox/sheet_outbox.sqlite3", load_worksheet, setelah_kirim=sinkron_setelah_kirim)
+    outbox.mulai_worker()
+    return outbox
+
+def sinkron_setelah_kirim(spreadsheet_id, sheet_name):
+    # Case baru sudah masuk sheet -> tarik ke salinan lokal casebase (index turunan
+    # seperti popularitas & case retrieval ikut diperbarui saat dipakai berikutnya)
+    if sheet_name == "Sheet2":
+        load_casebase_repo(spreadsheet_id, sheet_name).sync()
+
+# Index embedding case (keyword + sub-label) untuk mencari k case termirip
+@st.cache_resource
+def load_case_retrieval(spreadsheet_id, sheet_name):
+    vektor_kata = load_vektor_kata()
+    return CaseRetrieval(vektor_kata.query_vector, vektor_kata.sub_labels)
+
+# Tabel kafe x sub-label: berapa kali kafe dipilih user untuk sub-label itu.
+# Baris mengikuti daftar kafe versi artefak, jadi dibangun ulang per versi
+@st.cache_resource(max_entries=2)
+def load_popularity_table(spreadsheet_id, sheet_name, versi=None):
+    kafe_search = load_kafe_search(os.environ.get("KAFE_SEARCH_MODE", "exact"), versi)
+    return PopularityTable(kafe_search.names, load_vektor_kata().sub_labels)
 
 
 
@@ -155,7 +393,7 @@ def step_intro_query():
 # from kategori_suasana_dict import kategori_suasana  # ⬅️ taruh di bagian import
 from kategori_suasana_dict_updated import kategori_suasana
 
-def step_query_based():
+def step_query_based(res):
     from kategori_suasana_dict_updated import kategori_suasana
     from collections import defaultdict
 
@@ -187,29 +425,7 @@ def step_query_based():
             st.warning("Masukkan minimal satu sub-aspek dari kategori yang tersedia.")
             return
 
-        kafe_dengan_skor = []
-
-        for nama_kafe, group in df_review.groupby("Nama Kafe"):
-            tokens = []
-            for _, row in group.iterrows():
-                tokens.extend(row["tokens_negated_indo"] + row["tokens_negated_english"])
-
-            subaspek_match_count = 0
-            mention_dict = {}
-
-            for sub_label, keywords in preferensi_dict.items():
-                matched_keywords = [k for k in keywords if k in tokens]
-                if matched_keywords:
-                    subaspek_match_count += 1
-                    for k in matched_keywords:
-                        mention_dict[k] = tokens.count(k)
-
-            total_mentions = sum(mention_dict.values())
-
-            if subaspek_match_count > 0:
-                kafe_dengan_skor.append((nama_kafe, mention_dict, subaspek_match_count, total_mentions))
-
-        kafe_dengan_skor = sorted(kafe_dengan_skor, key=lambda x: (-x[2], -x[3]))[:10]
+        kafe_dengan_skor = res["engine"].query_based(preferensi_dict)
 
         if not kafe_dengan_skor:
             st.warning("😕 Tidak ditemukan kafe yang sesuai.")
@@ -258,7 +474,7 @@ def step_intro_crs():
         st.session_state.step = "crs_cbr"
         st.rerun()
 
-def step_crs_cbr():
+def step_crs_cbr(res):
     import os
     import json
     from kategori_suasana_dict_updated import kategori_suasana
@@ -306,16 +522,27 @@ def step_crs_cbr():
     #     casebase = []
 
 
-    casebase = baca_casebase_dari_gsheet(
-        spreadsheet_id="1RlsZ4h9FLSX_2J5wNuDn_fBQcVhSAnLe3A7eXqoB9HI", 
+    # Dipanggil untuk efek sampingnya saja: sync pertama / sync background kalau basi, dan
+    # pesan error kalau casebase gagal dibaca. Lookup-nya sendiri lewat index fingerprint
+    baca_casebase_dari_gsheet(
+        spreadsheet_id=CASEBASE_SPREADSHEET_ID,
         sheet_name="Sheet2"
     )
 
+    # Index fingerprint dibangun saat casebase dimuat & diperbarui saat ada case baru
+    case_index = load_casebase_repo(CASEBASE_SPREADSHEET_ID, "Sheet2").index
+
 
 
+    case_match = cari_case_sama(case_index, all_keywords, preferensi_label)
 
+    # Selain yang persis sama, tampilkan pilihan user dengan preferensi paling mirip
+    kafe_serupa = cari_kafe_pilihan_serupa(CASEBASE_SPREADSHEET_ID, "Sheet2", all_keywords, preferensi_label)
+    if kafe_serupa:
+        with st.expander("👥 User dengan preferensi mirip memilih..."):
+            for nama_kafe, jumlah, skor in kafe_serupa:
+                st.markdown(f"- ☕ **{nama_kafe}** — dipilih {jumlah}x (kemiripan preferensi: {skor:.2f})")
 
-    case_match = cari_case_sama(casebase, all_keywords, preferensi_label)
     force_crs_run = False  # Flag untuk memaksa proses rekomendasi
 
     if case_match:
@@ -330,18 +557,12 @@ def step_crs_cbr():
             st.session_state.crs_preferensi_label = case_match["preferensi_label"]
             st.session_state.crs_refine_excluded = case_match.get("refine_excluded", [])
 
-            query_vec = make_query_vector(all_keywords, model_w2v)
-            similarity_scores = cosine_similarity(query_vec, X_matrix)[0]
-
-            df_result = df_kafe.copy()
-            df_result["Similarity"] = similarity_scores
-            df_result["FinalScore"] = df_result["Similarity"]
+            query_vec = res["engine"].query_vector(all_keywords)
 
-            df_selected = df_result[df_result["Nama Kafe"] == case_match["selected_kafe"]]
-
-            if not df_selected.empty:
-                st.session_state.crs_result_before_refine = df_selected.to_dict(orient="records")
-                st.session_state.kritik_dari_top5 = get_kritik_negatif(case_match["selected_kafe"], df_review, kata_kritik_umum, return_dict=True)
+            if case_match["selected_kafe"] in res["kafe_search"].row_of:
+                skor = res["kafe_search"].skor_kafe(query_vec, case_match["selected_kafe"])
+                st.session_state.crs_result_before_refine = buat_record_kafe(res, [(case_match["selected_kafe"], skor)])
+                st.session_state.kritik_dari_top5 = get_kritik_negatif(case_match["selected_kafe"], res["kafe_token_matrix"], kata_kritik_umum, return_dict=True)
                 st.session_state.crs_has_run = True
                 st.rerun()
             else:
@@ -356,17 +577,19 @@ def step_crs_cbr():
             force_crs_run = True
 
     if force_crs_run:
-        query_vec = make_query_vector(all_keywords, model_w2v)
-        similarity_scores = cosine_similarity(query_vec, X_matrix)[0]
-
-        df_result = df_kafe.copy()
-        df_result["Similarity"] = similarity_scores
-        df_result["FinalScore"] = df_result["Similarity"]
-
-        df_sorted = df_result.sort_values(by="FinalScore", ascending=False).head(5)
+        # Similarity + boost dari kafe yang sering dipilih user lain untuk sub-label yang sama
+        popularitas = skor_popularitas_kafe(
+            CASEBASE_SPREADSHEET_ID, "Sheet2", list(preferensi_label.values()), res["versi_artefak"]
+        )
 
         st.session_state.crs_keywords = all_keywords
-        st.session_state.crs_result_before_refine = df_sorted.to_dict(orient="records")
+        # KAFE_RANKER=hybrid: kandidat dari indeks keyword, lalu di-ranking ulang dengan similarity
+        if os.environ.get("KAFE_RANKER") == "hybrid":
+            st.session_state.crs_result_before_refine = res["engine"].hybrid(
+                preferensi_dict, k=5, popularitas=popularitas, fusi=os.environ.get("KAFE_HYBRID_FUSI", "linear")
+            )
+        else:
+            st.session_state.crs_result_before_refine = res["engine"].crs_rank(all_keywords, k=5, popularitas=popularitas)
         st.session_state.crs_has_run = True
         st.session_state.crs_preferensi_label = preferensi_label
         st.session_state.crs_refine_excluded = []
@@ -374,28 +597,23 @@ def step_crs_cbr():
     if st.session_state.get("crs_has_run"):
         st.success("✨ TOP 5 REKOMENDASI KAFE:")
 
-        for row in st.session_state.crs_result_before_refine:
-            tampilkan_kafe_dengan_detail(
-                row,
-                st.session_state.crs_keywords,
-                model_w2v,
-                df_review,
-                vector_cols=[col for col in df_kafe.columns if col.startswith("dim_")],
-                kata_kritik_umum=kata_kritik_umum,
-                preferensi_dict={
-                    sub: kategori_suasana[kat][sub]
-                    for kat, sub in st.session_state.crs_preferensi_label.items()
-                }
-            )
-
-        kritik_counter = defaultdict(int)
-        for row in st.session_state.crs_result_before_refine:
-            nama_kafe = row["Nama Kafe"]
-            kritik_dict = get_kritik_negatif(nama_kafe, df_review, kata_kritik_umum, return_dict=True)
-            for k, v in kritik_dict.items():
-                kritik_counter[k] += v
+        penjelasan_list = hitung_penjelasan_kafe_sesi(
+            res,
+            "crs_cbr",
+            st.session_state.crs_result_before_refine,
+            st.session_state.crs_keywords,
+            preferensi_dict={
+                sub: kategori_suasana[kat][sub]
+                for kat, sub in st.session_state.crs_preferensi_label.items()
+            },
+            excluded=st.session_state.get("crs_refine_excluded", [])
+        )
+        for penjelasan in penjelasan_list:
+            tampilkan_penjelasan_kafe(penjelasan)
 
-        st.session_state.kritik_dari_top5 = dict(kritik_counter)
+        # Jumlah kritik top 5 (dipakai step refine) dihitung di background selagi user membaca hasil
+        nama_top5 = tuple(row["Nama Kafe"] for row in st.session_state.crs_result_before_refine)
+        prefetch(("kritik_dari_top5", nama_top5), res["engine"].kritik_top_kafe, nama_top5)
 
         st.markdown("---")
 
@@ -428,7 +646,7 @@ def step_crs_cbr():
                 st.session_state.crs_final_case = case
 
                 # simpan_case_ke_gsheet_casebase(case, spreadsheet_id="1RlsZ4h9FLSX_2J5wNuDn_fBQcVhSAnLe3A7eXqoB9HI", sheet_name="Sheet2")
-                ok, msg = simpan_case_ke_gsheet_casebase(case, spreadsheet_id="1RlsZ4h9FLSX_2J5wNuDn_fBQcVhSAnLe3A7eXqoB9HI", sheet_name="Sheet2")
+                ok, msg = simpan_case_ke_gsheet_casebase(case, spreadsheet_id=CASEBASE_SPREADSHEET_ID, sheet_name="Sheet2")
                 # st.success(msg) if ok else st.error(msg)
                 # st.write("Debug msg:", msg)
                 # st.write("Type of msg:", type(msg))
@@ -448,7 +666,12 @@ def step_crs_cbr():
                 # with open("casebase.json", "w") as f:
                 #     json.dump(existing, f, indent=4)
 
-                st.success(f"Pilihan '{selected_kafe}' berhasil disimpan ke casebase.json ✅")
+                # Case lewat outbox: baru terlihat di CaseBase & popularitas setelah worker
+                # mengirimnya ke sheet dan salinan lokal di-sync (biasanya beberapa detik)
+                if ok:
+                    st.success(f"Pilihan '{selected_kafe}' tersimpan ✅ Akan masuk CaseBase dalam beberapa detik.")
+                else:
+                    st.error(msg)
                 st.session_state.case_dari_crs_cbr_flat = case
                 st.session_state.simpan_has_clicked = True
 
@@ -463,8 +686,7 @@ def step_crs_cbr():
                 st.rerun()
 
 
-def step_crs_refine():
-    import pandas as pd
+def step_crs_refine(res):
     from collections import defaultdict
     from kategori_suasana_dict_updated import kategori_suasana
 
@@ -486,6 +708,9 @@ def step_crs_refine():
                     tambah_keywords_dict[sub_label] = keyword_list
 
     # 🚫 Pilih kritik dari rekomendasi awal yang ingin dihindari
+    nama_top5 = tuple(row["Nama Kafe"] for row in st.session_state.get("crs_result_before_refine", []))
+    st.session_state.kritik_dari_top5 = ambil_prefetch(("kritik_dari_top5", nama_top5), res["engine"].kritik_top_kafe, nama_top5)
+
     st.markdown("🚫 Pilih kritik yang ingin dihindari dari ulasan sebelumnya:")
     kritik_check = []
     for k, v in st.session_state.get("kritik_dari_top5", {}).items():
@@ -498,69 +723,29 @@ def step_crs_refine():
         tambah_keywords = [kw for kws in tambah_keywords_dict.values() for kw in kws]
         full_keywords = list(set(tambah_keywords))  # Hanya ambil yang dicentang sekarang (bukan gabungan manual)
 
-        # 🔍 Hitung similarity dan penalti
-        query_vec = make_query_vector(full_keywords, model_w2v)
-        similarity_scores = cosine_similarity(query_vec, X_matrix)[0]
-
-        df_result = df_kafe.copy()
-        df_result["Similarity"] = similarity_scores
-
-        penalti_list = []
-        for nama in df_result["Nama Kafe"]:
-            total_kritik = hitung_total_kritik(nama, df_review, hindari_input)
-            penalti_list.append(total_kritik)
-
-        df_result["Penalti"] = penalti_list
-        df_result["FinalScore"] = df_result["Similarity"] - 0.01 * df_result["Penalti"]
-
-        df_sorted = df_result.sort_values(by="FinalScore", ascending=False)
-
-        # ❌ Filter kafe yang mengandung kata yang ingin dihindari
-        filtered_rows = []
-        for _, row in df_sorted.iterrows():
-            nama = row["Nama Kafe"]
-            df_kafe_rows = df_review[df_review["Nama Kafe"] == nama]
-            tokens_all = sum((r["tokens_negated_indo"] + r["tokens_negated_english"] for _, r in df_kafe_rows.iterrows()), [])
-            if not any(k in tokens_all for k in hindari_input):
-                filtered_rows.append(row)
-
-        # ⛔ Jika hasil < 5, coba longgarin filter
-        if len(filtered_rows) < 5:
-            max_kritik_awal = 0
-            for row in st.session_state.get("crs_result_before_refine", []):
-                nama = row["Nama Kafe"]
-                max_kritik_awal = max(max_kritik_awal, hitung_total_kritik(nama, df_review, hindari_input))
-
-            for _, row in df_sorted.iterrows():
-                if row in filtered_rows:
-                    continue
-                nama = row["Nama Kafe"]
-                df_kafe_rows = df_review[df_review["Nama Kafe"] == nama]
-                tokens_all = sum((r["tokens_negated_indo"] + r["tokens_negated_english"] for _, r in df_kafe_rows.iterrows()), [])
-                total_kritik = sum(tokens_all.count(k) for k in hindari_input)
-                if total_kritik < max_kritik_awal:
-                    filtered_rows.append(row)
-                if len(filtered_rows) >= 5:
-                    break
-
-        top_kafe = pd.DataFrame(filtered_rows).head(5)
+        # 🔍 Similarity, penalti kata yang dihindari, dan popularitas -> top 5 baru
+        popularitas = skor_popularitas_kafe(
+            CASEBASE_SPREADSHEET_ID, "Sheet2", list(tambah_keywords_dict.keys()), res["versi_artefak"]
+        )
+        top_kafe = res["engine"].refine(
+            full_keywords,
+            hindari_input,
+            [row["Nama Kafe"] for row in st.session_state.get("crs_result_before_refine", [])],
+            k=5,
+            popularitas=popularitas
+        )
 
         # ✅ Tampilkan hasil
         st.success("🔍 Berikut hasil rekomendasi setelah refinement:")
-        for _, row in top_kafe.iterrows():
-            tampilkan_kafe_dengan_detail(
-                row,
-                full_keywords,
-                model_w2v,
-                df_review,
-                vector_cols=[col for col in df_kafe.columns if col.startswith("dim_")],
-                kata_kritik_umum=kata_kritik_umum,
-                preferensi_dict=st.session_state.get("preferensi_dict", {})
-            )
+        penjelasan_list = res["engine"].penjelasan(
+            top_kafe, full_keywords, st.session_state.get("preferensi_dict", {})
+        )
+        for penjelasan in penjelasan_list:
+            tampilkan_penjelasan_kafe(penjelasan)
 
         # 🟡 Simpan hasil ke session_state
         st.session_state.crs_keywords = full_keywords
-        st.session_state.crs_result_after_refine = top_kafe.to_dict(orient="records")
+        st.session_state.crs_result_after_refine = top_kafe
         st.session_state.crs_refine_added = full_keywords  # Yang dicentang saat ini
         st.session_state.crs_refine_excluded = hindari_input
         st.session_state.crs_refine_added_label = list(tambah_keywords_dict.keys())
@@ -578,7 +763,7 @@ def step_crs_refine():
         st.rerun()
 
 
-def step_crs_compare():
+def step_crs_compare(res):
     import os
     import json
     from kategori_suasana_dict_updated import kategori_suasana
@@ -615,31 +800,25 @@ def step_crs_compare():
         for kategori, sub_label in preferensi_label.items()
     }
 
+    # Penjelasan sebelum & sesudah refinement dihitung sekaligus dalam satu pass
+    penjelasan_list = hitung_penjelasan_kafe_sesi(
+        res,
+        "crs_compare",
+        before + after,
+        keywords,
+        preferensi_dict=preferensi_dict,
+        excluded=excluded
+    )
+
     with col1:
         st.markdown("### 🔵 Sebelum Refinement")
-        for row in before:
-            tampilkan_kafe_dengan_detail(
-                row,
-                keywords,
-                model_w2v,
-                df_review,
-                vector_cols=[col for col in df_kafe.columns if col.startswith("dim_")],
-                kata_kritik_umum=kata_kritik_umum,
-                preferensi_dict=preferensi_dict
-            )
+        for penjelasan in penjelasan_list[:len(before)]:
+            tampilkan_penjelasan_kafe(penjelasan)
 
     with col2:
         st.markdown("### 🟢 Setelah Refinement")
-        for row in after:
-            tampilkan_kafe_dengan_detail(
-                row,
-                keywords,
-                model_w2v,
-                df_review,
-                vector_cols=[col for col in df_kafe.columns if col.startswith("dim_")],
-                kata_kritik_umum=kata_kritik_umum,
-                preferensi_dict=preferensi_dict
-            )
+        for penjelasan in penjelasan_list[len(before):]:
+            tampilkan_penjelasan_kafe(penjelasan)
 
     st.markdown("### ✅ Menurut kamu, hasil mana yang lebih cocok?")
     pilihan = st.radio("Jawaban kamu:", ["Sebelum refinement", "Setelah refinement", "Sama saja"], key="pilih_compare")
@@ -672,7 +851,7 @@ def step_crs_compare():
         st.session_state.crs_final_case = case
 
 
-        ok, msg = simpan_case_ke_gsheet_casebase(case, spreadsheet_id="1RlsZ4h9FLSX_2J5wNuDn_fBQcVhSAnLe3A7eXqoB9HI", sheet_name="Sheet2")
+        ok, msg = simpan_case_ke_gsheet_casebase(case, spreadsheet_id=CASEBASE_SPREADSHEET_ID, sheet_name="Sheet2")
         # st.success(msg) if ok else st.error(msg)
         # st.write("💬 Isi msg:")
         # st.write(type(msg), msg)
@@ -691,7 +870,10 @@ def step_crs_compare():
         # with open("casebase.json", "w") as f:
         #     json.dump(existing, f, indent=4)
 
-        st.success(f"Pilihan kamu '{selected_kafe}' berhasil disimpan ke casebase.json ✅")
+        if ok:
+            st.success(f"Pilihan kamu '{selected_kafe}' tersimpan ✅ Akan masuk CaseBase dalam beberapa detik.")
+        else:
+            st.error(msg)
         st.session_state.simpan_compare_has_clicked = True
 
     if st.session_state.simpan_compare_has_clicked:
@@ -1039,7 +1221,7 @@ def step_pamit():
         # Kirim ke GSheet
         success, message = kirim_data_ke_gsheet(
             data_user,
-            spreadsheet_id="1RlsZ4h9FLSX_2J5wNuDn_fBQcVhSAnLe3A7eXqoB9HI",
+            spreadsheet_id=CASEBASE_SPREADSHEET_ID,
             sheet_name="Sheet1"
         )
         # st.success(message) if success else st.error(message)
@@ -1056,16 +1238,17 @@ def step_pamit():
 # ==================
 # KUMPULAN FUNGSI SUPPORTING ALGORITHM
 # ==================
-def query_filter_kafe(df_review, keyword_list):
+def query_filter_kafe(df_review, review_tokens, vocab, keyword_list):
     keyword_list = [k.lower().strip() for k in keyword_list if k.strip()]
     df_filtered = df_review.copy()
 
     if keyword_list:
-        def contains_keywords(row):
-            tokens = row['tokens_negated_indo'] + row['tokens_negated_english']
-            return all(k in tokens for k in keyword_list)
+        # Review harus mengandung semua keyword (dicek lewat id token)
+        mask = np.ones(len(review_tokens), dtype=bool)
+        for k in keyword_list:
+            mask &= review_tokens.mask_review_dengan_token(vocab.id(k))
 
-        df_filtered = df_filtered[df_filtered.apply(contains_keywords, axis=1)]
+        df_filtered = df_filtered[mask]
 
     return df_filtered.groupby("Nama Kafe").first().reset_index()
 
@@ -1073,49 +1256,42 @@ def query_filter_kafe(df_review, keyword_list):
 def int_default():
     return defaultdict(int)
 
-@st.cache_data
-def get_keyword_mentions_per_kafe(df_review, keywords):
+def get_keyword_mentions_per_kafe(kafe_token_matrix, nama_kafe_list, keywords):
     hasil = defaultdict(int_default)  # gunakan fungsi global tadi
 
-    for _, row in df_review.iterrows():
-        nama_kafe = row['Nama Kafe']
-        tokens = row['tokens_negated_indo'] + row['tokens_negated_english']
-        for k in keywords:
-            hasil[nama_kafe][k] += tokens.count(k.lower())
+    nama_kafe_list = [nama for nama in nama_kafe_list if nama in kafe_token_matrix["kafe_id"]]
+    counts = hitung_mention_kafe(kafe_token_matrix, nama_kafe_list, [k.lower() for k in keywords])
 
-    return hasil
+    for i, nama_kafe in enumerate(nama_kafe_list):
+        for j, k in enumerate(keywords):
+            hasil[nama_kafe][k] += int(counts[i, j])
 
-def make_query_vector(keywords, model, vector_size=100):
-    vectors = [model.wv[k] for k in keywords if k in model.wv]
-    if vectors:
-        return np.mean(vectors, axis=0).reshape(1, -1)
-    return np.zeros((1, vector_size))
+    return hasil
 
-kata_kritik_umum = ["mahal", "rame", "berisik", "bising", "lambat", "pelayan_lama", "kotor",
-    "sempit", "panas", "gerah", "jutek", "antri", "macet", "crowded",
-    "tidak_bersih", "tidak_aman", "overpriced"]
+def buat_record_kafe(res, hasil):
+    # (nama, skor) -> baris dict seperti df_result sebelumnya, hanya untuk kafe terpilih
+    idx = [res["kafe_search"].row_of[nama] for nama, _ in hasil]
+    records = res["df_kafe"].iloc[idx].to_dict(orient="records")
+    for record, (_, skor) in zip(records, hasil):
+        record["Similarity"] = skor
+        record["FinalScore"] = skor
+    return records
 
-def get_kritik_negatif(nama_kafe, df_review, kritik_list, return_dict=False):
+def get_kritik_negatif(nama_kafe, kafe_token_matrix, kritik_list, return_dict=False):
     from collections import defaultdict
 
     kritik_dict = defaultdict(int)
-    df_kafe = df_review[df_review["Nama Kafe"] == nama_kafe]
+    counts = hitung_mention_kafe(kafe_token_matrix, [nama_kafe], kritik_list)[0]
 
-    for _, row in df_kafe.iterrows():
-        tokens = row["tokens_negated_indo"] + row["tokens_negated_english"]
-        for k in kritik_list:
-            kritik_dict[k] += tokens.count(k)
+    for k, v in zip(kritik_list, counts):
+        kritik_dict[k] += int(v)
 
     kritik_filtered = {k: v for k, v in kritik_dict.items() if v > 0}
 
     if return_dict:
         return kritik_filtered
 
-    if kritik_filtered:
-        kritik_lines = "\n".join([f"- {v} menyebut **{k}**" for k, v in sorted(kritik_filtered.items(), key=lambda x: -x[1])])
-        return f"⚠️ Kritik umum ditemukan:\n{kritik_lines}"
-    else:
-        return "⚠️ Tidak ditemukan kritik umum di review."
+    return format_kritik_str(kritik_filtered)
 
 
 
@@ -1129,70 +1305,54 @@ def get_kritik_negatif(nama_kafe, df_review, kritik_list, return_dict=False):
 
     return kritik_str
 
-def tampilkan_kafe_dengan_detail(row, keywords, model, df_review, vector_cols, kata_kritik_umum, preferensi_dict):
-    import numpy as np
-    from collections import defaultdict
-
-    nama_kafe = row["Nama Kafe"]
-    kafe_vec = np.array([row[col] for col in vector_cols])  # aman
-
-    similarity = row["Similarity"]
-    sentiment = row.get("avg_sentiment", None)
-    final_score = row["FinalScore"]
-
-    # Hitung similarity per sub-aspek (gabungan keyword dalam preferensi_dict)
-    cocok_sub = []
-    for sub_label, keyword_list in preferensi_dict.items():
-        keyword_vec = make_query_vector(keyword_list, model)
-        sim_score = cosine_similarity(keyword_vec, [kafe_vec])[0][0]
-        if sim_score > 0.3:  # ambang minimal relevansi
-            cocok_sub.append((sub_label, sim_score))
-
-    # Susun kalimat cocok dengan preferensi
-    if cocok_sub:
-        cocok_sub = sorted(cocok_sub, key=lambda x: -x[1])  # urutkan dari sim tertinggi
-        sub_names = [s[0] for s in cocok_sub]
-        avg_sim = np.mean([s[1] for s in cocok_sub])
-        if len(sub_names) == 1:
-            cocok_str = sub_names[0]
-        else:
-            cocok_str = ", ".join(sub_names[:-1]) + " dan " + sub_names[-1]
-        cocok_str += f" (sim: {avg_sim:.2f})"
-    else:
-        cocok_str = "-"
-
-    # Mention ulasan
-    mention_dict = get_keyword_mentions_per_kafe(df_review[df_review["Nama Kafe"] == nama_kafe], keywords).get(nama_kafe, {})
-    mention_str_parts = [f"{v} menyebut '{k}'" for k, v in mention_dict.items() if v > 0]
-    mention_str = ", ".join(mention_str_parts) if mention_str_parts else "Tidak ada ulasan relevan."
-
-    # Kritik umum
-    kritik_str = get_kritik_negatif(nama_kafe, df_review, kata_kritik_umum)
-
-    # Tampilkan
-    st.markdown(f"### ⭐ {nama_kafe}")
-    st.markdown(f"- Similarity Score     : `{similarity:.4f}`")
-    if sentiment is not None:
-        st.markdown(f"- Avg Sentiment        : `{sentiment:.2f}`")
-    st.markdown(f"- Final Score (penalti): `{final_score:.4f}`")
-    st.markdown(f"- ✅ Cocok dengan preferensi: {cocok_str}")
-    st.markdown(f"- 📊 {mention_str}")
-    st.markdown(f"- {kritik_str}")
+def hitung_penjelasan_kafe_sesi(res, step, rows, keywords, preferensi_dict, excluded=(), maks_entri=16):
+    # Cache per sesi: rerun karena klik widget (radio, checkbox) cukup menampilkan ulang
+    # record penjelasan yang sudah dihitung. Jumlah hit/miss dicatat per step.
+    # Versi artefak ikut jadi key: setelah hot-swap, penjelasan dihitung ulang dari vektor baru
+    key = (
+        res["versi_artefak"],
+        step,
+        tuple(keywords),
+        tuple(preferensi_dict),
+        tuple(excluded),
+        tuple((row["Nama Kafe"], row["FinalScore"]) for row in rows)
+    )
+    cache = st.session_state.setdefault("cache_penjelasan", {})
+    statistik = st.session_state.setdefault("cache_penjelasan_statistik", {}).setdefault(step, {"hit": 0, "miss": 0})
+
+    if key in cache:
+        statistik["hit"] += 1
+        cache[key] = cache.pop(key)  # pindah ke belakang: urutan dict = urutan terakhir dipakai (LRU)
+        return cache[key]
+
+    statistik["miss"] += 1
+    if len(cache) >= maks_entri:
+        del cache[next(iter(cache))]  # buang entri yang paling lama tidak dipakai
+    cache[key] = res["engine"].penjelasan(rows, keywords, preferensi_dict)
+    return cache[key]
+
+def tampilkan_penjelasan_kafe(penjelasan):
+    st.markdown(f"### ⭐ {penjelasan['nama_kafe']}")
+    st.markdown(f"- Similarity Score     : `{penjelasan['similarity']:.4f}`")
+    if penjelasan["sentiment"] is not None:
+        st.markdown(f"- Avg Sentiment        : `{penjelasan['sentiment']:.2f}`")
+    st.markdown(f"- Final Score (penalti): `{penjelasan['final_score']:.4f}`")
+    st.markdown(f"- ✅ Cocok dengan preferensi: {penjelasan['cocok_str']}")
+    st.markdown(f"- 📊 {penjelasan['mention_str']}")
+    st.markdown(f"- {penjelasan['kritik_str']}")
     # Tambahkan kata yang dihindari kalau ada
     excluded_words = st.session_state.get("crs_refine_excluded", [])
     if excluded_words:
         st.markdown(f"- 🚫 Menghindari kata: `{', '.join(excluded_words)}`")
     st.markdown("---")
 
-
-
 def aspek_yang_cocok(kafe_vec, keywords, model):
     from kategori_suasana_dict_updated import kategori_suasana
     label_sim = {}
 
     for k in keywords:
-        if k in model.wv:
-            sim = cosine_similarity([model.wv[k]], [kafe_vec])[0][0]
+        if k in model:
+            sim = float(normalisasi(model[k])[0] @ normalisasi(kafe_vec)[0])
             label = get_label_dari_keyword(k)  # ← ini map raw ke label
             if label not in label_sim or sim > label_sim[label]:
                 label_sim[label] = sim
@@ -1201,34 +1361,20 @@ def aspek_yang_cocok(kafe_vec, keywords, model):
     return [(label, f"{sim:.2f}") for label, sim in cocok]
 
 
-def hitung_total_kritik(nama_kafe, df_review, kritik_list):
-    kritik_dict = defaultdict(int)
-    df_kafe = df_review[df_review["Nama Kafe"] == nama_kafe]
-    for _, row in df_kafe.iterrows():
-        tokens = row["tokens_negated_indo"] + row["tokens_negated_english"]
-        for k in kritik_list:
-            kritik_dict[k] += tokens.count(k)
-    return sum(kritik_dict.values())
-
-def ambil_kritik_dari_top_kafe(top_kafe, df_review, kritik_list):
-    kritik_terpakai = set()
-    for row in top_kafe:
-        nama_kafe = row["Nama Kafe"]
-        df_kafe = df_review[df_review["Nama Kafe"] == nama_kafe]
-        for _, r in df_kafe.iterrows():
-            tokens = r["tokens_negated_indo"] + r["tokens_negated_english"]
-            for k in kritik_list:
-                if k in tokens:
-                    kritik_terpakai.add(k)
+def hitung_total_kritik(nama_kafe, kafe_token_matrix, kritik_list):
+    return int(hitung_mention_kafe(kafe_token_matrix, [nama_kafe], kritik_list).sum())
+
+def ambil_kritik_dari_top_kafe(top_kafe, kafe_token_matrix, kritik_list):
+    nama_kafe_list = [row["Nama Kafe"] for row in top_kafe]
+    counts = hitung_mention_kafe(kafe_token_matrix, nama_kafe_list, kritik_list)
+    kritik_terpakai = {k for k, v in zip(kritik_list, counts.sum(axis=0)) if v > 0}
     return sorted(list(kritik_terpakai))
 
-def ambil_kritik_dict(nama_kafe, df_review, kritik_list):
+def ambil_kritik_dict(nama_kafe, kafe_token_matrix, kritik_list):
     kritik_dict = defaultdict(int)
-    df_kafe = df_review[df_review["Nama Kafe"] == nama_kafe]
-    for _, row in df_kafe.iterrows():
-        tokens = row["tokens_negated_indo"] + row["tokens_negated_english"]
-        for k in kritik_list:
-            kritik_dict[k] += tokens.count(k)
+    counts = hitung_mention_kafe(kafe_token_matrix, [nama_kafe], kritik_list)[0]
+    for k, v in zip(kritik_list, counts):
+        kritik_dict[k] += int(v)
     return {k: v for k, v in kritik_dict.items() if v > 0}
 
 def get_labels_dari_keywords(keywords, kategori_suasana):
@@ -1324,7 +1470,7 @@ def simpan_ke_casebase(user, preferensi, nama_kafe, detail_kafe):
     with open(casebase_path, "w") as f:
         json.dump(casebase, f, indent=2)
 
-def ambil_detail_kafe(nama_kafe):
+def ambil_detail_kafe(df_kafe, nama_kafe):
     row = df_kafe[df_kafe["Nama Kafe"] == nama_kafe].iloc[0]
     return row.to_dict()
 
@@ -1335,11 +1481,24 @@ def tampilkan_kafe_dengan_detail_dict(row):
     st.markdown(f"- Final Score (penalti): `{row.get('FinalScore', '-')}`")
     # Bisa tambahkan detail lain jika ingin
 
-def cari_case_sama(casebase, keywords, preferensi_label):
-    for case in casebase:
-        if sorted(case.get("crs_keywords", [])) == sorted(keywords) and case.get("preferensi_label", {}) == preferensi_label:
-            return case
-    return None
+def cari_case_sama(case_index, keywords, preferensi_label):
+    # Lookup O(1) lewat fingerprint (keyword terurut + preferensi_label)
+    return case_index.cari(keywords, preferensi_label)
+
+def cari_semua_case_sama(case_index, keywords, preferensi_label):
+    return case_index.cari_semua(keywords, preferensi_label)
+
+def cari_kafe_pilihan_serupa(spreadsheet_id, sheet_name, keywords, preferensi_label, k=5):
+    # k case termirip (embedding keyword + sub-label), case baru dari repo ditambahkan bertahap
+    case_retrieval = load_case_retrieval(spreadsheet_id, sheet_name)
+    case_retrieval.perbarui(load_casebase_repo(spreadsheet_id, sheet_name))
+    return case_retrieval.kafe_pilihan_serupa(keywords, preferensi_label, k)
+
+def skor_popularitas_kafe(spreadsheet_id, sheet_name, sub_labels, versi=None):
+    # Vektor popularitas semua kafe untuk sub-label yang dipilih, tanpa scan casebase per query
+    popularitas = load_popularity_table(spreadsheet_id, sheet_name, versi)
+    popularitas.perbarui(load_casebase_repo(spreadsheet_id, sheet_name))
+    return popularitas.skor(sub_labels)
 
 
 # def baca_casebase_dari_gsheet(spreadsheet_id, sheet_name="Sheet2"):
@@ -1409,34 +1568,14 @@ def cari_case_sama(casebase, keywords, preferensi_label):
 
 
 def baca_casebase_dari_gsheet(spreadsheet_id, sheet_name="Sheet2"):
-    import pygsheets
-    import json
+    # Langsung dari salinan lokal; sync ke GSheet berjalan di background kalau sudah basi
+    repo = load_casebase_repo(spreadsheet_id, sheet_name)
+    casebase = repo.semua_case()
 
-    try:
-        # Gunakan secrets di deploy Streamlit Cloud
-        json_key = dict(st.secrets["gcp_service_account"])
-        import tempfile
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".json", mode="w") as tmp:
-            json.dump(json_key, tmp)
-            tmp_path = tmp.name
-
-        gc = pygsheets.authorize(service_file=tmp_path)
-        sh = gc.open_by_key(spreadsheet_id)
-        wks = sh.worksheet_by_title(sheet_name)
-        df = wks.get_as_df()
-
-        json_cols = ["crs_keywords", "preferensi_label", "refine_added", "refine_excluded", "user_identity"]
-        for col in json_cols:
-            if col in df.columns:
-                df[col] = df[col].apply(
-                    lambda x: json.loads(x) if isinstance(x, str) and x.strip() and (x.strip().startswith("{") or x.strip().startswith("[")) else x
-                )
-
-        return df.to_dict(orient="records")
+    if not casebase and repo.error_terakhir is not None:
+        st.error(f"❌ Gagal membaca CaseBase dari GSheet: {repo.error_terakhir}")
 
-    except Exception as e:
-        st.error(f"❌ Gagal membaca CaseBase dari GSheet: {e}")
-        return []
+    return casebase
 
 
 
@@ -1473,6 +1612,8 @@ def simpan_data_user(filepath="hasil_testing_user.json"):
 
 
 def format_data_for_gsheet(data_dict):
+    import pandas as pd
+
     formatted = {}
     for k, v in data_dict.items():
         if v is None:
@@ -1490,28 +1631,14 @@ def format_data_for_gsheet(data_dict):
 
 
 def kirim_data_ke_gsheet(data_dict, spreadsheet_id, sheet_name="hasil_user_testing"):
-    import pygsheets
-    import json
-    import pandas as pd
-    import tempfile
-
     try:
-        # gc = pygsheets.authorize(service_file=file_json_handler)  # 🟢 untuk lokal
-        if "gcp_service_account" in st.secrets:
-            json_key = dict(st.secrets["gcp_service_account"])
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".json", mode="w") as tmp:
-                json.dump(json_key, tmp)
-                service_file_path = tmp.name
-
-        sh = gc.open_by_key(spreadsheet_id)
-        wks = sh.worksheet_by_title(sheet_name)
-
         formatted_data = format_data_for_gsheet(data_dict)
-        wks.append_table(list(formatted_data.values()), dimension='ROWS')
+        # 📤 Masuk outbox lokal dulu, dikirim ke Google Sheets oleh worker background
+        load_sheet_outbox().tambah(spreadsheet_id, sheet_name, list(formatted_data.values()))
 
-        return True, "✅ Data berhasil dikirim ke Google Sheets."
+        return True, "✅ Data tersimpan dan akan dikirim ke Google Sheets."
     except Exception as e:
-        return False, f"❌ Gagal mengirim data ke Google Sheets: {e}"
+        return False, f"❌ Gagal menyimpan data untuk Google Sheets: {e}"
 
 
 # def simpan_case_ke_gsheet_casebase(case_dict, spreadsheet_id, sheet_name="Sheet2"):
@@ -1547,28 +1674,10 @@ def kirim_data_ke_gsheet(data_dict, spreadsheet_id, sheet_name="hasil_user_testi
 
 
 def simpan_case_ke_gsheet_casebase(case_dict, spreadsheet_id, sheet_name="Sheet2"):
-    import pygsheets
     import json
-    import tempfile
     from datetime import datetime
-    import streamlit as st
 
     try:
-        # 🔐 Gunakan secrets saat di-deploy
-        if "gcp_service_account" in st.secrets:
-            json_key = dict(st.secrets["gcp_service_account"])
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".json", mode="w") as tmp:
-                json.dump(json_key, tmp)
-                service_file_path = tmp.name
-        else:
-            # 🧪 Untuk local dev, pakai file langsung
-            service_file_path = "client_secret.json"
-
-        # ✅ Autentikasi pygsheets
-        gc = pygsheets.authorize(service_file=service_file_path)
-        sh = gc.open_by_key(spreadsheet_id)
-        wks = sh.worksheet_by_title(sheet_name)
-
         # ⏱️ Tambahkan timestamp kalau belum ada
         if "timestamp" not in case_dict:
             case_dict["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -1583,12 +1692,13 @@ def simpan_case_ke_gsheet_casebase(case_dict, spreadsheet_id, sheet_name="Sheet2
             else:
                 formatted[k] = str(v)
 
-        # 📤 Append ke Google Sheets
-        wks.append_table(list(formatted.values()), dimension="ROWS")
-        return True, "✅ Case berhasil ditambahkan ke CaseBase."
+        # 📤 Masuk outbox lokal dulu; setelah terkirim, salinan lokal casebase ikut di-sync.
+        # Eventually consistent: sampai itu terjadi, case ini belum ikut lookup CBR & popularitas
+        load_sheet_outbox().tambah(spreadsheet_id, sheet_name, list(formatted.values()))
+        return True, "✅ Case tersimpan dan akan ditambahkan ke CaseBase."
 
     except Exception as e:
-        return False, f"❌ Gagal menambahkan case ke GSheet: {e}"
+        return False, f"❌ Gagal menyimpan case untuk GSheet: {e}"
 
 
 
@@ -1599,22 +1709,26 @@ def simpan_case_ke_gsheet_casebase(case_dict, spreadsheet_id, sheet_name="Sheet2
 if "step" not in st.session_state:
     st.session_state.step = "intro"
 
+versi_artefak = versi_artefak_aktif()
+res = muat_resource(STEP_RESOURCES.get(st.session_state.step, []), versi_artefak)
+
 if st.session_state.step == "intro":
     step_intro()
+    mulai_panaskan_resource()
 elif st.session_state.step == "identity":
     step_identity()
 elif st.session_state.step == "intro_query":
     step_intro_query()
 elif st.session_state.step == "query_based":
-    step_query_based()
+    step_query_based(res)
 elif st.session_state.step == "intro_crs":
     step_intro_crs()
 elif st.session_state.step == "crs_cbr":
-    step_crs_cbr()
+    step_crs_cbr(res)
 elif st.session_state.step == "crs_refine":
-    step_crs_refine()
+    step_crs_refine(res)
 elif st.session_state.step == "crs_compare":
-    step_crs_compare()
+    step_crs_compare(res)
 elif st.session_state.step == "survey_1_app1":
     step_survey_1_app1()
 elif st.session_state.step == "survey_1_app2":
@@ -1623,3 +1737,13 @@ elif st.session_state.step == "survey_2":
     step_survey_2()
 elif st.session_state.step == "pamit":
     step_pamit()
+
+prefetch_step_berikutnya(st.session_state.step, versi_artefak)
+
+# 🧪 KAFE_DEBUG_CACHE: tampilkan hit/miss cache penjelasan per step di sidebar
+if os.environ.get("KAFE_DEBUG_CACHE"):
+    for step, statistik in st.session_state.get("cache_penjelasan_statistik", {}).items():
+        st.sidebar.caption(f"cache penjelasan {step}: {statistik['hit']} hit / {statistik['miss']} miss")
+    st.sidebar.caption(f"artefak kafe: {os.path.basename(versi_artefak) if versi_artefak else 'offline'}")
+    for antrian in load_sheet_outbox().status():
+        st.sidebar.caption(f"outbox {antrian['sheet_name']}: {antrian['tertunda']} tertunda")
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from kafe_engine import KafeEngine, buat_kafe_search, buat_kafe_token_matrix, buat_token_index, pilih_kafe_refine
+from review_cache import TOKEN_COLS, encode_review_tokens
+from vocabulary import Vocabulary
+
+
+def refine_referensi(total_kritik, max_kritik_awal, k=5):
+    # Loop asli di step_crs_refine (sebelum divektorkan): kafe tanpa kritik dulu, lalu
+    # dilonggarkan ke kafe dengan kritik < max_kritik_awal, keduanya urut ranking.
+    # Cek "sudah terpilih" per indeks (versi lama membandingkan Series -> ambiguous)
+    terpilih = [i for i, t in enumerate(total_kritik) if t == 0]
+    if len(terpilih) < k:
+        for i, t in enumerate(total_kritik):
+            if i in terpilih:
+                continue
+            if t < max_kritik_awal:
+                terpilih.append(i)
+            if len(terpilih) >= k:
+                break
+    return terpilih[:k]
+
+
+def buat_engine(kritik):
+    # Kafe i: similarity ke query "kopi" turun seiring i (selisih > penalti maksimum di sini,
+    # jadi ranking = urutan kafe) dan kata "mahal" muncul kritik[i] kali di review-nya
+    daftar_kafe = [f"Kafe {i}" for i in range(len(kritik))]
+    df_review = pd.DataFrame({
+        "Nama Kafe": daftar_kafe,
+        TOKEN_COLS[0]: [["kopi"] + ["mahal"] * n for n in kritik],
+        TOKEN_COLS[1]: [[] for _ in kritik]
+    })
+    vocab = Vocabulary(["kopi", "mahal"])
+    kafe_token_matrix = buat_kafe_token_matrix(df_review, encode_review_tokens(df_review, vocab), vocab)
+
+    vectors = np.zeros((len(kritik), 100), dtype=np.float32)
+    vectors[:, 0] = 1.0
+    vectors[:, 1] = 0.5 * np.arange(len(kritik))
+    df_kafe = pd.DataFrame(vectors, columns=[f"dim_{i}" for i in range(100)])
+    df_kafe.insert(0, "Nama Kafe", daftar_kafe)
+
+    word_vectors = {"kopi": np.eye(100, dtype=np.float32)[0]}
+    return KafeEngine(kafe_token_matrix, buat_token_index(kafe_token_matrix), df_kafe,
+                      buat_kafe_search(df_kafe), word_vectors)
+
+
+def refine_nama(kritik, k=5):
+    engine = buat_engine(kritik)
+    prev_top = [f"Kafe {i}" for i in range(5)]
+    hasil = engine.refine(["kopi"], ["mahal"], prev_top, k=k)
+    return [row["Nama Kafe"] for row in hasil], hasil
+
+
+def test_pilih_kafe_refine_sama_dengan_loop_referensi():
+    rng = np.random.default_rng(0)
+    for _ in range(3000):
+        total_kritik = rng.integers(0, 5, size=rng.integers(0, 30))
+        max_kritik_awal = int(rng.integers(0, 6))
+        k = int(rng.integers(1, 8))
+        hasil = pilih_kafe_refine(total_kritik, max_kritik_awal, k=k)
+        assert hasil.tolist() == refine_referensi(total_kritik.tolist(), max_kritik_awal, k)
+
+
+def test_pilih_kafe_refine_seri_tetap_urut_ranking():
+    # Pelonggaran tidak mengurutkan ulang berdasarkan jumlah kritik
+    assert pilih_kafe_refine(np.array([0, 2, 1, 2, 1]), 3).tolist() == [0, 1, 2, 3, 4]
+    assert pilih_kafe_refine(np.array([1, 1, 0, 1, 1, 1]), 2).tolist() == [2, 0, 1, 3, 4]
+
+
+def test_refine_tanpa_kritik_didahulukan():
+    nama, hasil = refine_nama([1, 0, 2, 0, 0, 0, 0, 3])
+    assert nama == ["Kafe 1", "Kafe 3", "Kafe 4", "Kafe 5", "Kafe 6"]
+    assert [row["Penalti"] for row in hasil] == [0, 0, 0, 0, 0]
+
+
+@pytest.mark.parametrize("kritik, expected", [
+    # 1-4 kafe lolos filter ketat -> dilonggarkan (dulu: "truth value ... is ambiguous")
+    ([0, 1, 2, 3, 1, 2, 3, 1], [0, 1, 2, 4, 5]),
+    ([1, 0, 3, 0, 2, 1, 1, 3], [1, 3, 0, 4, 5]),
+    ([2, 0, 0, 1, 0, 3, 1, 1], [1, 2, 4, 3, 6]),
+    ([0, 3, 0, 0, 3, 0, 1, 1], [0, 2, 3, 5, 6])
+])
+def test_refine_dilonggarkan_kalau_kurang_dari_k(kritik, expected):
+    nama, _ = refine_nama(kritik)
+    assert nama == [f"Kafe {i}" for i in expected]
+    assert nama == [f"Kafe {i}" for i in refine_referensi(kritik, max(kritik[:5]))]
+
+
+def test_refine_boleh_kurang_dari_k():
+    # Tidak ada kafe lain dengan kritik < kritik terbanyak di top 5 awal
+    nama, _ = refine_nama([3, 0, 3, 3, 3, 3, 3, 3])
+    assert nama == ["Kafe 1"]
@@ -0,0 +1,17 @@
+import os
+
+
+# Artefak hasil ingest, satu folder per versi (v0001, v0002, ...); file CURRENT menunjuk
+# versi aktif dan diganti atomik, jadi app bisa pindah versi tanpa restart.
+# Modul terpisah tanpa pandas/numpy: app membaca CURRENT di setiap rerun, termasuk halaman intro
+INGEST_DIR = "data/cache/ingest"
+
+
+def baca_versi_aktif(ingest_dir=INGEST_DIR):
+    # -> path folder versi aktif, atau None kalau belum pernah ada ingest
+    try:
+        with open(os.path.join(ingest_dir, "CURRENT"), "r", encoding="utf-8") as f:
+            nama = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return os.path.join(ingest_dir, nama) if nama else None
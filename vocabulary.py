@@ -0,0 +1,98 @@
+import numpy as np
+
+
+LIBRARY_PATH = "data/tokens_library.txt"
+
+
+class Vocabulary:
+    # Pemetaan token <-> id; id 0..n-1 mengikuti urutan tokens_library.txt
+    def __init__(self, tokens, freq=None):
+        self.id_to_token = list(tokens)
+        self.token_to_id = {t: i for i, t in enumerate(self.id_to_token)}
+        # Frekuensi hanya tersedia untuk token library (id < n_library)
+        self.freq = np.zeros(len(self.id_to_token), dtype=np.int64) if freq is None else np.asarray(freq, dtype=np.int64)
+        self.n_library = len(self.id_to_token)
+
+    def __len__(self):
+        return len(self.id_to_token)
+
+    def __contains__(self, token):
+        return token in self.token_to_id
+
+    def id(self, token):
+        return self.token_to_id.get(token, -1)
+
+    def ids(self, tokens):
+        return np.array([self.token_to_id.get(t, -1) for t in tokens], dtype=np.int32)
+
+    def token(self, token_id):
+        return self.id_to_token[token_id]
+
+    def tambah(self, token):
+        # Token di luar library (OOV) diberi id baru di belakang
+        token_id = self.token_to_id.get(token)
+        if token_id is None:
+            token_id = len(self.id_to_token)
+            self.id_to_token.append(token)
+            self.token_to_id[token] = token_id
+        return token_id
+
+    def encode(self, tokens):
+        return np.fromiter((self.tambah(t) for t in tokens), dtype=np.int32, count=len(tokens))
+
+    def token_tambahan(self):
+        return self.id_to_token[self.n_library:]
+
+
+def load_vocabulary(path=LIBRARY_PATH):
+    tokens, freq = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if ":" not in line:
+                continue
+            token, jumlah = line.rsplit(":", 1)
+            tokens.append(token.strip())
+            freq.append(int(jumlah))
+    return Vocabulary(tokens, freq)
+
+
+class ReviewTokens:
+    # Token semua review dalam format CSR: token review ke-i ada di ids[offsets[i]:offsets[i + 1]]
+    def __init__(self, ids, offsets, n_indo=None):
+        self.ids = ids
+        self.offsets = offsets
+        # Jumlah token indo per review (sisanya token english), untuk memisah kolom lagi
+        self.n_indo = n_indo
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def panjang(self):
+        return np.diff(self.offsets)
+
+    def review(self, i):
+        return self.ids[self.offsets[i]:self.offsets[i + 1]]
+
+    def baris_per_token(self):
+        # Nomor review untuk setiap posisi di ids
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.panjang())
+
+    def mask_review_dengan_token(self, token_id):
+        mask = np.zeros(len(self), dtype=bool)
+        if token_id < 0:
+            return mask
+        posisi = np.flatnonzero(self.ids == token_id)
+        mask[np.searchsorted(self.offsets, posisi, side="right") - 1] = True
+        return mask
+
+    def to_lists(self, vocab):
+        tokens = np.array(vocab.id_to_token, dtype=object)[self.ids]
+        return [tokens[a:b].tolist() for a, b in zip(self.offsets[:-1], self.offsets[1:])]
+
+    @classmethod
+    def from_lists(cls, token_lists, vocab, n_indo=None):
+        panjang = np.fromiter((len(t) for t in token_lists), dtype=np.int64, count=len(token_lists))
+        offsets = np.zeros(len(token_lists) + 1, dtype=np.int64)
+        np.cumsum(panjang, out=offsets[1:])
+        flat = [t for tokens in token_lists for t in tokens]
+        return cls(vocab.encode(flat), offsets, n_indo)
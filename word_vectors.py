@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from review_cache import _sidik_file, _sidik_sama
+
+
+MODEL_PATH = "data/word2vec_model.model"
+CACHE_DIR = "data/cache/word2vec"
+
+
+def _path_cache(cache_dir, nama):
+    return os.path.join(cache_dir, nama)
+
+
+def konversi_model_ke_keyed_vectors(model_path=MODEL_PATH, cache_dir=CACHE_DIR):
+    # App hanya memakai model.wv: simpan KeyedVectors saja (tanpa syn1neg & state training).
+    # sep_limit=0 -> semua array numpy jadi file .npy terpisah yang bisa di-mmap
+    from gensim.models import Word2Vec
+
+    os.makedirs(cache_dir, exist_ok=True)
+    model = Word2Vec.load(model_path)
+    model.wv.save(_path_cache(cache_dir, "word_vectors.kv"), sep_limit=0)
+
+    # Meta ditulis terakhir, jadi hasil konversi yang setengah jadi tidak dianggap valid
+    meta = {"source": _sidik_file(model_path), "vector_size": model.wv.vector_size, "n_kata": len(model.wv)}
+    with open(_path_cache(cache_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def keyed_vectors_masih_valid(model_path=MODEL_PATH, cache_dir=CACHE_DIR):
+    meta_path = _path_cache(cache_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return False
+
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    # Tanpa file model (mis. saat deploy hanya membawa cache), KeyedVectors dipakai apa adanya
+    if os.path.exists(model_path) and not _sidik_sama(model_path, meta["source"]):
+        return False
+    return True
+
+
+def load_keyed_vectors(model_path=MODEL_PATH, cache_dir=CACHE_DIR, mmap="r"):
+    from gensim.models import KeyedVectors
+
+    if not keyed_vectors_masih_valid(model_path, cache_dir):
+        konversi_model_ke_keyed_vectors(model_path, cache_dir)
+
+    # mmap="r": vektor dibaca langsung dari file (page cache), dipakai bersama antar proses
+    return KeyedVectors.load(_path_cache(cache_dir, "word_vectors.kv"), mmap=mmap)
+
+
+def _ukur_load(kode_import, kode_load):
+    # Diukur di proses baru supaya import gensim & RSS tidak terbawa dari pengukuran lain.
+    # RSS saat ini dibaca dari /proc/self/statm (Linux)
+    script = (
+        "import os, time\n"
+        "rss = lambda: int(open('/proc/self/statm').read().split()[1]) * os.sysconf('SC_PAGE_SIZE')\n"
+        "t0 = time.perf_counter()\n"
+        f"{kode_import}\n"
+        "t1, rss1 = time.perf_counter(), rss()\n"
+        f"{kode_load}\n"
+        "print(t1 - t0, time.perf_counter() - t1, rss1, rss())\n"
+    )
+    hasil = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    t_import, t_load, rss_import, rss_load = [float(x) for x in hasil.stdout.split()]
+    return t_import, t_load, (rss_load - rss_import) / 2**20
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ekspor KeyedVectors dari model Word2Vec dan bandingkan waktu load & RSS.")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args()
+
+    meta = konversi_model_ke_keyed_vectors(args.model, args.cache_dir)
+
+    kv_path = _path_cache(args.cache_dir, "word_vectors.kv")
+    t_import, t_model, rss_model = _ukur_load(
+        "from gensim.models import Word2Vec", f"model = Word2Vec.load({args.model!r}).wv"
+    )
+    _, t_kv, rss_kv = _ukur_load(
+        "from gensim.models import KeyedVectors", f"model = KeyedVectors.load({kv_path!r}, mmap='r')"
+    )
+
+    print(f"Kata               : {meta['n_kata']} x {meta['vector_size']} dim")
+    print(f"import gensim      : {t_import:.2f} s (tidak lagi dibayar saat halaman intro)")
+    print(f"Word2Vec.load      : {t_model:.2f} s, +{rss_model:.1f} MiB RSS")
+    print(f"KeyedVectors mmap  : {t_kv:.2f} s, +{rss_kv:.1f} MiB RSS (vektor di page cache, dipakai bersama)")